@@ -0,0 +1,5 @@
+from .analysis_cache import AnalysisCache, analysis_key
+from .compaction import PromptCompactor, estimate_tokens, html_to_text
+from .fanout import FanOutAnalyzer, section_content
+from .streaming import StreamResult, consume_stream
+from .retrieval import NewsIndex, tokenize
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# 分析结果默认保留 7 天
+ANALYSIS_TTL = 7 * 24 * 3600
+
+
+def _normalize(content) -> str:
+    # 合并多余空白，避免无意义的格式差异导致缓存未命中
+    return " ".join(str(content).split())
+
+
+def analysis_key(model: str, messages: list) -> str:
+    """
+    计算分析请求的缓存键
+    :param model: 模型名称
+    :param messages: 发送给模型的消息列表
+    :return: sha256 摘要
+    """
+    system = [_normalize(m["content"]) for m in messages if m["role"] == "system"]
+    payload = [[m["role"], _normalize(m["content"])] for m in messages if m["role"] != "system"]
+    raw = json.dumps([model, system, payload], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache(object):
+    """
+    LLM 分析结果缓存
+    以 模型 + 系统提示词 + 规范化后的新闻内容 的摘要为键保存分析结果与耗时，
+    推送失败重试、进程重启时相同请求直接返回缓存结果，不再重复调用模型；
+    超过有效期或条目数超过上限时按最近使用时间淘汰；
+    查询只更新内存中的统计与使用时间，在保存结果或 flush 时写入文件
+    """
+    # 缓存文件路径
+    cache_path: str
+    # 结果有效期（秒）
+    ttl: int
+    # 最大条目数
+    max_entries: int
+    # 统计 {"hits", "misses", "saved_seconds"}
+    stats: dict
+
+    def __init__(self, cache_path: str, ttl: int = ANALYSIS_TTL, max_entries: int = 200):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._entries = {}
+        # 是否有尚未写入文件的统计或使用时间
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = data.get("entries", {})
+            self.stats.update(data.get("stats", {}))
+        except Exception as e:
+            self.logger.warning(f"读取分析缓存失败: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries, "stats": self.stats}, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            self.logger.warning(f"保存分析缓存失败: {e}")
+            return
+        self._dirty = False
+
+    def _evict(self, now: float):
+        self._entries = {
+            key: entry for key, entry in self._entries.items()
+            if now - entry["created_at"] < self.ttl
+        }
+        if len(self._entries) > self.max_entries:
+            keep = sorted(self._entries, key=lambda key: self._entries[key]["used_at"])[-self.max_entries:]
+            self._entries = {key: self._entries[key] for key in keep}
+
+    def get(self, key: str) -> str:
+        """
+        获取仍在有效期内的分析结果，并更新命中统计
+        :param key: 缓存键，见 analysis_key
+        :return: 分析结果，不存在或已过期时返回 None
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            self._dirty = True
+            if not entry or now - entry["created_at"] >= self.ttl:
+                self.stats["misses"] += 1
+                return None
+            entry["used_at"] = now
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry["elapsed"]
+            return entry["content"]
+
+    def put(self, key: str, content: str, elapsed: float):
+        """
+        保存分析结果
+        :param key: 缓存键
+        :param content: 分析结果
+        :param elapsed: 本次调用模型的耗时（秒），命中时累计为节省的时间
+        """
+        with self._lock:
+            now = time.time()
+            self._entries[key] = {
+                "content": content,
+                "elapsed": elapsed,
+                "created_at": now,
+                "used_at": now,
+            }
+            self._evict(now)
+            self._save()
+
+    def invalidate(self, key: str):
+        """
+        删除缓存的分析结果
+        :param key: 缓存键
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def flush(self):
+        """
+        保存查询后更新的统计与使用时间，退出前调用
+        """
+        with self._lock:
+            if self._dirty:
+                self._save()
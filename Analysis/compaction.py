@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import re
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# 块级标签，前后换行
+BLOCK_TAGS = {"p", "div", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "table", "tr"}
+# 内容整体丢弃的标签
+SKIP_TAGS = {"script", "style"}
+# 只有链接的行视为样板内容
+URL_LINE = re.compile(r"^(?:-\s*)?https?://\S+$")
+# 段落标题，如 "[ MAPS ]"、"[地图]"
+SECTION_HEADER = re.compile(r"^\[\s*(.+?)\s*\]$")
+CJK_CHAR = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+TRUNCATED_MARK = "……（内容过长已截断）"
+
+
+class _TextExtractor(HTMLParser):
+    """
+    将 Steam 新闻的 HTML 描述转换为紧凑的纯文本，列表项转换为带缩进的 "- " 项目符号
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._list_depth = 0
+        self._skip_depth = 0
+
+    def _newline(self):
+        self.parts.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in ("ul", "ol"):
+            self._list_depth += 1
+            self._newline()
+        elif tag == "li":
+            self._newline()
+            self.parts.append("  " * max(0, self._list_depth - 1) + "- ")
+        elif tag == "br" or tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in ("ul", "ol"):
+            self._list_depth = max(0, self._list_depth - 1)
+            self._newline()
+        elif tag in BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """
+    去除 HTML 标记，保留段落标题与列表结构，丢弃图片与只有链接的行
+    :param html: 新闻描述 HTML
+    :return: 紧凑文本
+    """
+    if not html:
+        return ""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    lines = []
+    for raw_line in "".join(extractor.parts).split("\n"):
+        indent = raw_line[:len(raw_line) - len(raw_line.lstrip(" "))]
+        line = " ".join(raw_line.split())
+        if not line or line == "-" or URL_LINE.match(line):
+            continue
+        header = SECTION_HEADER.match(line)
+        if header:
+            line = f"[{header.group(1)}]"
+        lines.append(indent + line)
+    return "\n".join(lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计 token 数：中日韩字符按每字 1 个，其余按每 4 个字符 1 个
+    :param text: 文本
+    :return: token 数
+    """
+    cjk = len(CJK_CHAR.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """
+    按行截断文本，使估计 token 数不超过预算
+    :param text: 文本
+    :param budget: token 预算
+    :return: 截断后的文本，未超出预算时原样返回
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    budget -= estimate_tokens(TRUNCATED_MARK)
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            # 第一行就超出预算时按字符截断
+            if not kept:
+                kept.append(line[:max(0, budget)])
+            break
+        kept.append(line)
+        used += cost
+    kept.append(TRUNCATED_MARK)
+    return "\n".join(kept)
+
+
+class PromptCompactor(object):
+    """
+    分析前的提示词压缩
+    将新闻的 HTML 描述转换为紧凑文本，并按 token 预算截断，
+    减少输入 token 与首字延迟；压缩前后的 token 估计值会记录到日志
+    """
+    # 单次分析请求中新闻内容的 token 预算
+    token_budget: int
+
+    def __init__(self, token_budget: int = 6000):
+        self.token_budget = token_budget
+
+    @staticmethod
+    def format_news(news: dict, content: str) -> str:
+        return (
+            f"标题: {news['title']}\n"
+            f"日期: {news['pubDate']}\n"
+            f"链接: {news['link']}\n"
+            f"内容:\n{content}"
+        )
+
+    def compact(self, news_items: list) -> str:
+        """
+        将新闻列表压缩为分析请求的用户消息
+        :param news_items: 新闻列表
+        :return: 紧凑文本
+        """
+        before = estimate_tokens(f"{news_items}")
+        # 预算在各条新闻间平均分配，标题、链接等字段不参与截断
+        per_item_budget = self.token_budget // max(1, len(news_items))
+        parts = []
+        for news in news_items:
+            header_tokens = estimate_tokens(self.format_news(news, ""))
+            content = html_to_text(news.get("description") or "")
+            content = truncate_to_budget(content, max(0, per_item_budget - header_tokens))
+            parts.append(self.format_news(news, content))
+        text = "\n\n".join(parts)
+        after = estimate_tokens(text)
+        logger.info(
+            f"提示词压缩完成，{len(news_items)}条新闻，估计token数{before} -> {after}"
+            f"(减少{(1 - after / before) * 100 if before else 0:.0f}%)"
+        )
+        return text
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FanOutAnalyzer(object):
+    """
+    逐条并行分析
+    每条新闻单独发起一次分析请求，在有并发上限的线程池中执行，
+    积压多条新闻时总耗时接近最慢的一条而不是所有新闻之和；
+    单条失败不影响其他新闻，合并时以原文链接代替失败的分析结果
+    """
+    # 同时进行的分析请求上限
+    max_concurrency: int
+
+    def __init__(self, max_concurrency: int = 4):
+        self.max_concurrency = max_concurrency
+        self.logger = logging.getLogger(__name__)
+        # 进程内共享线程池，多个订阅源同时分析时也不会超过并发上限
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="analysis")
+
+    def _analyze_one(self, analyze, news: dict) -> dict:
+        started = time.monotonic()
+        try:
+            content = analyze(news)
+            error = None
+        except Exception as e:
+            content = None
+            error = str(e)
+            self.logger.error(f"新闻《{news['title']}》分析失败: {e}")
+        return {"news": news, "content": content, "error": error, "elapsed": time.monotonic() - started}
+
+    def analyze(self, news_items: list, analyze) -> list:
+        """
+        并行分析多条新闻
+        :param news_items: 新闻列表
+        :param analyze: 单条分析函数 analyze(news) -> 分析结果，失败时抛出异常
+        :return: 与 news_items 顺序一致的结果列表，每项包含 news / content / error / elapsed
+        """
+        started = time.monotonic()
+        # 在调用方的上下文中分析，日志沿用当前的关联 id
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, self._analyze_one, analyze, news)
+            for news in news_items
+        ]
+        results = [future.result() for future in futures]
+        failed = sum(1 for result in results if result["error"] is not None)
+        self.logger.info(
+            f"逐条分析完成，共{len(results)}条，失败{failed}条，"
+            f"总耗时{time.monotonic() - started:.1f}秒，"
+            f"最慢单条{max((result['elapsed'] for result in results), default=0):.1f}秒"
+        )
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def section_content(result: dict) -> str:
+    """
+    单条分析结果对应的内容，分析失败时以原文链接代替
+    :param result: FanOutAnalyzer.analyze 返回的一项
+    :return: 内容
+    """
+    if result["error"] is None:
+        return result["content"]
+    news = result["news"]
+    return f"<p>{news['title']}：分析失败，请查看原文 <a href=\"{news['link']}\">{news['link']}</a></p>"
+
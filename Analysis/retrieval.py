@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from .compaction import PromptCompactor, html_to_text
+
+logger = logging.getLogger(__name__)
+
+# 英文与数字按单词切分，中日韩文字按相邻两字切分
+WORD = re.compile(r"[a-z0-9]+")
+CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+")
+TRUNCATED_MARK = "……"
+
+
+def tokenize(text: str) -> list:
+    """
+    切分检索词：英文与数字单词（单个字母除外），中日韩文字取相邻两字，单字成段时保留单字
+    :param text: 文本
+    :return: 检索词列表，保留重复
+    """
+    text = text.lower()
+    terms = [word for word in WORD.findall(text) if len(word) > 1 or word.isdigit()]
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _cut_utf8(text: str, limit: int) -> str:
+    return text.encode("utf-8")[:max(0, limit)].decode("utf-8", errors="ignore")
+
+
+class NewsIndex(object):
+    """
+    历史新闻的 BM25 倒排索引
+    索引标题与去除 HTML 后的描述，持久化在 SQLite 中，新增新闻时增量更新；
+    查询时按文档频率从低到高选取检索词，读取的倒排记录数有上限，数万条历史下仍为毫秒级
+    """
+    # 单次查询最多使用的检索词数，优先使用区分度高（文档频率低）的词
+    max_query_terms: int
+    # 单次查询最多读取的倒排记录数，几乎每篇都出现的词区分度低，超出上限后不再使用
+    max_postings: int
+    # BM25 参数
+    k1: float
+    b: float
+    # SQLite 日志模式，多个主机通过共享卷共用索引时使用 DELETE
+    journal_mode: str
+
+    def __init__(self, db_path: str, max_query_terms: int = 48, max_postings: int = 5000, k1: float = 1.2,
+                 b: float = 0.75, journal_mode: str = "WAL"):
+        self.db_path = db_path
+        self.max_query_terms = max_query_terms
+        self.max_postings = max_postings
+        self.k1 = k1
+        self.b = b
+        self.journal_mode = journal_mode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        if journal_mode.upper() == "WAL":
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "doc_id INTEGER PRIMARY KEY, doc_key TEXT NOT NULL UNIQUE, title TEXT, link TEXT, "
+                "pub_date TEXT, text TEXT, length INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    @staticmethod
+    def doc_key(news: dict) -> str:
+        return news.get("link") or news["pubDate"]
+
+    def _stat(self, key: str) -> float:
+        row = self._conn.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._stat("docs"))
+
+    def indexed_position(self) -> int:
+        """
+        :return: 已补建到的新闻存储写入位置，见 NewsStore.position
+        """
+        with self._lock:
+            return int(self._stat("store_position"))
+
+    def set_indexed_position(self, position: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)", ("store_position", position)
+            )
+
+    def add(self, news_items) -> int:
+        """
+        增量索引新闻，已索引的新闻会被忽略
+        :param news_items: 新闻列表或可迭代对象
+        :return: 新索引的条数
+        """
+        added = 0
+        total_length = 0
+        with self._lock, self._conn:
+            for news in news_items:
+                doc_key = self.doc_key(news)
+                # 先判断是否已索引，已索引的新闻不再转换文本与切分检索词
+                if self._conn.execute("SELECT 1 FROM docs WHERE doc_key = ?", (doc_key,)).fetchone():
+                    continue
+                text = html_to_text(news.get("description") or "")
+                terms = Counter(tokenize(f"{news.get('title') or ''}\n{text}"))
+                length = sum(terms.values())
+                cursor = self._conn.execute(
+                    "INSERT INTO docs (doc_key, title, link, pub_date, text, length) VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_key, news.get("title"), news.get("link"), news.get("pubDate"), text, length),
+                )
+                doc_id = cursor.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()],
+                )
+                self._conn.executemany(
+                    "INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in terms],
+                )
+                added += 1
+                total_length += length
+            if added:
+                self._conn.executemany(
+                    "INSERT INTO stats (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                    [("docs", added), ("length", total_length)],
+                )
+        return added
+
+    def remove(self, keys) -> int:
+        """
+        从索引中删除新闻
+        :param keys: 新闻键列表
+        :return: 删除的条数
+        """
+        removed = 0
+        total_length = 0
+        with self._lock, self._conn:
+            for key in keys:
+                row = self._conn.execute("SELECT doc_id, length FROM docs WHERE doc_key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                doc_id, length = row
+                self._conn.execute(
+                    "UPDATE terms SET df = df - 1 WHERE term IN (SELECT term FROM postings WHERE doc_id = ?)",
+                    (doc_id,),
+                )
+                self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+                removed += 1
+                total_length += length
+            if removed:
+                self._conn.execute("DELETE FROM terms WHERE df <= 0")
+                self._conn.executemany(
+                    "UPDATE stats SET value = value - ? WHERE key = ?",
+                    [(removed, "docs"), (total_length, "length")],
+                )
+        return removed
+
+    def update(self, news_items: list) -> int:
+        """
+        以新内容重建已索引新闻的索引，用于新闻被编辑后
+        :param news_items: 新闻列表
+        :return: 重新索引的条数
+        """
+        self.remove([self.doc_key(news) for news in news_items])
+        return self.add(news_items)
+
+    def search(self, query: str, top_k: int = 3, exclude: set = None) -> list:
+        """
+        按 BM25 查询最相关的历史新闻
+        :param query: 查询文本
+        :param top_k: 返回条数
+        :param exclude: 需要排除的新闻键，如正在分析的新闻本身
+        :return: 按相关度降序的新闻列表，每项包含 title / link / pubDate / text / score
+        """
+        query_terms = set(tokenize(query))
+        if not query_terms or top_k <= 0:
+            return []
+        with self._lock:
+            doc_count = self._stat("docs")
+            if not doc_count:
+                return []
+            avg_length = self._stat("length") / doc_count
+            placeholders = ",".join("?" * len(query_terms))
+            rows = self._conn.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders}) ORDER BY df LIMIT ?",
+                (*query_terms, self.max_query_terms),
+            ).fetchall()
+            if not rows:
+                return []
+            idf = {}
+            budget = self.max_postings
+            for term, df in rows:
+                # 至少保留区分度最高的一个词
+                if idf and df > budget:
+                    break
+                idf[term] = math.log((doc_count - df + 0.5) / (df + 0.5) + 1)
+                budget -= df
+            placeholders = ",".join("?" * len(idf))
+            postings = self._conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.doc_id = p.doc_id "
+                f"WHERE p.term IN ({placeholders})",
+                tuple(idf),
+            ).fetchall()
+
+            scores = {}
+            for term, doc_id, tf, length in postings:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * tf * (self.k1 + 1) / (tf + norm)
+
+            # 多取若干条，排除正在分析的新闻后仍能凑够 top_k
+            candidates = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k + len(exclude or ())]
+            results = []
+            for doc_id, score in candidates:
+                row = self._conn.execute(
+                    "SELECT doc_key, title, link, pub_date, text FROM docs WHERE doc_id = ?", (doc_id,)
+                ).fetchone()
+                if exclude and row[0] in exclude:
+                    continue
+                results.append({"title": row[1], "link": row[2], "pubDate": row[3], "text": row[4], "score": score})
+                if len(results) >= top_k:
+                    break
+        return results
+
+    def context(self, news_items: list, top_k: int = 3, byte_budget: int = 4000) -> str:
+        """
+        为待分析的新闻生成历史参考内容
+        :param news_items: 待分析的新闻
+        :param top_k: 最多引用的历史新闻条数
+        :param byte_budget: 历史参考内容的 UTF-8 字节上限
+        :return: 历史参考内容，没有相关历史时返回空字符串
+        """
+        started = time.monotonic()
+        query = "\n".join(
+            f"{news.get('title') or ''}\n{html_to_text(news.get('description') or '')}" for news in news_items
+        )
+        hits = self.search(query, top_k, exclude={self.doc_key(news) for news in news_items})
+
+        parts = []
+        used = 0
+        for hit in hits:
+            header = PromptCompactor.format_news(hit, "")
+            remaining = byte_budget - used - len(header.encode("utf-8")) - 2
+            if remaining <= len(TRUNCATED_MARK.encode("utf-8")):
+                break
+            text = hit["text"] or ""
+            if len(text.encode("utf-8")) > remaining:
+                text = _cut_utf8(text, remaining - len(TRUNCATED_MARK.encode("utf-8"))) + TRUNCATED_MARK
+            part = header + text
+            parts.append(part)
+            used += len(part.encode("utf-8")) + 2
+        logger.info(
+            f"历史检索完成，引用{len(parts)}条，{used}字节，耗时{(time.monotonic() - started) * 1000:.1f}毫秒"
+        )
+        return "\n\n".join(parts)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
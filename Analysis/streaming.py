@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StreamResult(object):
+    """
+    流式响应的消费结果
+    """
+    # 回答内容
+    content: str
+    # 推理内容，未保留时为空字符串
+    reasoning: str
+    # 首个 token 到达的耗时（秒），未收到任何 token 时为 None
+    ttft: float
+    # 总耗时（秒）
+    elapsed: float
+    # 输出 token 数，服务端未返回用量时按收到的分片数计
+    tokens: int
+    # 是否因超出时间预算而中断
+    timed_out: bool
+
+    def __init__(self, content: str, reasoning: str, ttft: float, elapsed: float, tokens: int, timed_out: bool):
+        self.content = content
+        self.reasoning = reasoning
+        self.ttft = ttft
+        self.elapsed = elapsed
+        self.tokens = tokens
+        self.timed_out = timed_out
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def consume_stream(response, started: float, deadline: float = None, keep_reasoning: bool = False) -> StreamResult:
+    """
+    消费 chat.completions 流式响应，分片先放入列表最后一次性拼接
+    超过截止时间时关闭流并返回已收到的部分内容
+    :param response: 流式响应
+    :param started: 请求发起时间（time.monotonic）
+    :param deadline: 截止时间（time.monotonic），为空时不限制
+    :param keep_reasoning: 是否保留推理内容
+    :return: StreamResult
+    """
+    content_parts = []
+    reasoning_parts = []
+    ttft = None
+    chunks = 0
+    usage_tokens = None
+    timed_out = False
+    # 服务端只发送 keep-alive 注释或长时间没有分片时循环内的检查不会执行，到期由定时器关闭流
+    watchdog = None
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        response.close()
+
+    if deadline is not None and hasattr(response, "close"):
+        watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), expire)
+        watchdog.daemon = True
+        watchdog.start()
+    try:
+        for chunk in response:
+            if getattr(chunk, "usage", None) is not None:
+                usage_tokens = chunk.usage.completion_tokens
+            if chunk.choices:
+                delta = chunk.choices[0].delta
+                reasoning_chunk = getattr(delta, "reasoning_content", None)
+                if reasoning_chunk or delta.content:
+                    chunks += 1
+                    if ttft is None:
+                        ttft = time.monotonic() - started
+                if reasoning_chunk:
+                    if keep_reasoning:
+                        reasoning_parts.append(reasoning_chunk)
+                elif delta.content:
+                    content_parts.append(delta.content)
+            if deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                break
+    except Exception as e:
+        # 读超时或流被定时器关闭，返回已收到的部分内容；截止时间前的错误照常抛出
+        if not expired.is_set() and (deadline is None or time.monotonic() < deadline):
+            raise
+        logger.debug(f"流式响应在截止时间后中断: {e}")
+        timed_out = True
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        if timed_out and hasattr(response, "close"):
+            response.close()
+    if expired.is_set():
+        # 定时器关闭流后迭代可能正常结束而不抛出异常
+        timed_out = True
+    return StreamResult(
+        content="".join(content_parts),
+        reasoning="".join(reasoning_parts),
+        ttft=ttft,
+        elapsed=time.monotonic() - started,
+        tokens=usage_tokens if usage_tokens is not None else chunks,
+        timed_out=timed_out,
+    )
@@ -0,0 +1,3 @@
+from .log import configure_logging, log_correlation
+from .metrics import REGISTRY, Registry, stage_timer, start_http_server
+from .transport import Transport, configure_transport, get_transport
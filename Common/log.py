@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import atexit
+import contextvars
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(cycle_id)s] %(message)s"
+# 日志中需要脱敏的查询参数与凭证格式
+SECRET_PATTERNS = (
+    re.compile(r"\b((?:access_token|corpsecret|secret|api_key|key|token)=)[^&\s'\"]+", re.IGNORECASE),
+    re.compile(r"(Bearer\s+)[^\s'\"]+", re.IGNORECASE),
+    re.compile(r"()\bsk-[A-Za-z0-9_-]{8,}"),
+)
+REDACTED = "***"
+
+# 当前处理周期的关联 id，同一轮检测、分析与推送的日志共享
+_cycle_id = contextvars.ContextVar("cycle_id", default="-")
+_listener = None
+
+
+@contextmanager
+def log_correlation(cycle_id: str = None):
+    """
+    在代码块内为日志附加关联 id
+    :param cycle_id: 关联 id，为空时生成新的 id
+    """
+    token = _cycle_id.set(cycle_id or uuid.uuid4().hex[:12])
+    try:
+        yield _cycle_id.get()
+    finally:
+        _cycle_id.reset(token)
+
+
+def current_cycle_id() -> str:
+    """
+    :return: 当前的关联 id，不在 log_correlation 代码块内时为 "-"
+    """
+    return _cycle_id.get()
+
+
+class RedactingQueueHandler(QueueHandler):
+    """
+    在调用方线程格式化消息、脱敏并附加关联 id 后放入队列，写磁盘由 QueueListener 的后台线程完成
+    """
+
+    def __init__(self, log_queue, secrets: list = None):
+        super().__init__(log_queue)
+        # 按长度倒序，避免较短的密钥先替换掉较长密钥的一部分
+        self.secrets = sorted({secret for secret in secrets or [] if secret}, key=len, reverse=True)
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, REDACTED)
+        for pattern in SECRET_PATTERNS:
+            text = pattern.sub(lambda match: match.group(1) + REDACTED, text)
+        return text
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.cycle_id = _cycle_id.get()
+        record = super().prepare(record)
+        record.msg = record.message = self.redact(record.msg)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    每行一个 JSON 对象的结构化日志
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "cycle_id": getattr(record, "cycle_id", "-"),
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def create_file_handler(file_path: str, rotate: str = "size", max_bytes: int = 10 * 1024 * 1024,
+                        backup_count: int = 7, when: str = "midnight", compress: bool = True) -> logging.Handler:
+    """
+    创建按大小或时间轮转的日志文件处理器
+    :param file_path: 日志文件路径
+    :param rotate: size 按大小轮转；time 按时间轮转
+    :param max_bytes: 按大小轮转时单个文件的字节上限
+    :param backup_count: 保留的历史文件数
+    :param when: 按时间轮转的周期，同 TimedRotatingFileHandler
+    :param compress: 是否以 gzip 压缩历史文件
+    """
+    if rotate == "time":
+        handler = TimedRotatingFileHandler(file_path, when=when, backupCount=backup_count, encoding="utf-8")
+    else:
+        handler = RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    if compress:
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def configure_logging(config: dict = None, secrets: list = None) -> QueueListener:
+    """
+    配置根日志：调用方线程只把脱敏后的日志放入队列，由后台线程写入控制台与轮转文件
+    :param config: 日志配置 {level, file, rotate, max_bytes, backup_count, when, compress, json}
+    :param secrets: 需要从日志中脱敏的密钥
+    :return: 后台写日志的 QueueListener，进程退出时自动停止
+    """
+    global _listener
+    config = config or {}
+    _stop_listener()
+
+    formatter = JsonFormatter() if config.get("json", False) else logging.Formatter(DEFAULT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if config.get("file", "cs_monitor.log"):
+        handlers.append(create_file_handler(
+            config.get("file", "cs_monitor.log"),
+            rotate=config.get("rotate", "size"),
+            max_bytes=config.get("max_bytes", 10 * 1024 * 1024),
+            backup_count=config.get("backup_count", 7),
+            when=config.get("when", "midnight"),
+            compress=config.get("compress", True),
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(RedactingQueueHandler(log_queue, secrets))
+    root.setLevel(config.get("level", "INFO"))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    # 进程退出前写完队列中剩余的日志
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import REGISTRY
+
+# 允许自动重试的幂等方法
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# 允许自动重试的状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+HTTP_RESPONSES = REGISTRY.counter("cs_monitor_http_responses_total", "按接口与状态码统计的 HTTP 响应数")
+
+
+class Transport(object):
+    """
+    统一的 HTTP 传输层
+    按主机维护带连接池的 keep-alive 会话，统一设置连接/读取超时与代理，
+    幂等请求在连接错误或 429/5xx 时按带抖动的指数退避重试
+    """
+    # 代理配置 {"http": ..., "https": ...}，为空时不使用代理
+    proxies: dict
+    # 使用代理的主机列表，为空时所有请求都使用代理
+    proxy_hosts: list
+    # 连接超时（秒）
+    connect_timeout: float
+    # 读取超时（秒）
+    read_timeout: float
+    # 幂等请求的最大重试次数
+    retries: int
+    # 退避基数（秒），第 n 次重试等待 backoff * 2^(n-1) 乘以 [0.5, 1.5) 的随机抖动
+    backoff: float
+    # 每个主机的连接池大小
+    pool_size: int
+
+    def __init__(self, proxies: dict = None, proxy_hosts: list = None, connect_timeout: float = 5,
+                 read_timeout: float = 30, retries: int = 3, backoff: float = 0.5, pool_size: int = 10):
+        self.proxies = proxies
+        self.proxy_hosts = proxy_hosts
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def session_for(self, url: str) -> requests.Session:
+        """
+        获取主机对应的会话，同一主机复用连接
+        :param url: 请求地址
+        :return: requests.Session
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def _proxies_for(self, url: str):
+        if not self.proxies:
+            return None
+        if self.proxy_hosts and urlsplit(url).hostname not in self.proxy_hosts:
+            return None
+        return self.proxies
+
+    def _sleep_before_retry(self, attempt: int):
+        delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+        time.sleep(delay)
+
+    def request(self, method: str, url: str, retry: bool = None, **kwargs) -> requests.Response:
+        """
+        发送请求
+        :param method: 请求方法
+        :param url: 请求地址
+        :param retry: 是否允许重试，默认仅幂等方法重试
+        :param kwargs: requests 相关参数，未指定 timeout/proxies 时使用统一配置
+        :return: requests.Response
+        """
+        method = method.upper()
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        kwargs.setdefault("proxies", self._proxies_for(url))
+        session = self.session_for(url)
+        max_attempts = self.retries + 1 if retry else 1
+
+        parts = urlsplit(url)
+        # 不带查询参数，避免 access_token 等敏感信息进入指标
+        endpoint = f"{parts.netloc}{parts.path}"
+        for attempt in range(max_attempts):
+            last_attempt = attempt == max_attempts - 1
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                HTTP_RESPONSES.inc(endpoint=endpoint, method=method, status=type(e).__name__)
+                if last_attempt:
+                    raise
+                self.logger.warning(f"请求失败，准备第{attempt + 1}次重试: {method} {urlsplit(url).netloc} {e}")
+                self._sleep_before_retry(attempt)
+                continue
+            HTTP_RESPONSES.inc(endpoint=endpoint, method=method, status=str(response.status_code))
+            if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                self.logger.warning(
+                    f"请求返回{response.status_code}，准备第{attempt + 1}次重试: {method} {urlsplit(url).netloc}")
+                response.close()
+                self._sleep_before_retry(attempt)
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def configure_transport(config: dict) -> Transport:
+    """
+    根据全局配置创建共享传输层
+    :param config: 全局配置，读取其中的 proxy 与 http 配置
+    :return: Transport
+    """
+    global _transport
+    proxy_config = config.get("proxy", {})
+    http_config = config.get("http", {})
+    proxies = None
+    if proxy_config.get("enabled"):
+        proxies = {"http": proxy_config["http"], "https": proxy_config["https"]}
+    transport = Transport(
+        proxies=proxies,
+        proxy_hosts=proxy_config.get("hosts"),
+        connect_timeout=http_config.get("connect_timeout", 5),
+        read_timeout=http_config.get("read_timeout", 30),
+        retries=http_config.get("retries", 3),
+        backoff=http_config.get("backoff", 0.5),
+        pool_size=http_config.get("pool_size", 10),
+    )
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = transport
+    return transport
+
+
+def get_transport() -> Transport:
+    """
+    获取共享传输层，未配置时使用默认参数创建
+    :return: Transport
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
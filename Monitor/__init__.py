@@ -0,0 +1 @@
+from .feed_cache import FeedCache
\ No newline at end of file
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+
+
+class FeedCache(object):
+    """
+    RSS 条件请求缓存
+    按订阅地址持久化 ETag / Last-Modified 校验值和上一次响应内容的摘要，
+    用于发送 If-None-Match / If-Modified-Since 请求头，并在 304 或内容摘要未变化时跳过后续解析流程
+    """
+    # 状态文件路径
+    file_path: str
+    # 按订阅地址保存的校验值 {url: {"etag", "last_modified", "digest"}}
+    feeds: dict
+    # 轮询统计 {"polls", "not_modified", "digest_unchanged"}
+    stats: dict
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.feeds = {}
+        self.stats = {"polls": 0, "not_modified": 0, "digest_unchanged": 0}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.feeds = data.get("feeds", {})
+            self.stats.update(data.get("stats", {}))
+        except Exception as e:
+            self.logger.error(f"加载RSS缓存状态失败，将重新建立: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.file_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"feeds": self.feeds, "stats": self.stats}, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            self.logger.error(f"保存RSS缓存状态失败: {e}")
+
+    def request_headers(self, url: str) -> dict:
+        """
+        生成条件请求头
+        :param url: 订阅地址
+        :return: 包含 If-None-Match / If-Modified-Since 的请求头
+        """
+        headers = {}
+        with self._lock:
+            entry = self.feeds.get(url, {})
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_unchanged(self, url: str, status_code: int, headers, content: bytes) -> bool:
+        """
+        根据响应判断订阅内容是否变化，并更新内存中的统计
+        内容变化时新的校验值暂存为待提交状态，需在本轮处理完成后调用 commit 才会生效，
+        以免推送失败后下一轮因校验值命中而漏掉新闻
+        :param url: 订阅地址
+        :param status_code: 响应状态码
+        :param headers: 响应头
+        :param content: 响应内容
+        :return: 内容未变化返回 True
+        """
+        with self._lock:
+            self.stats["polls"] += 1
+            if status_code == 304:
+                self.stats["not_modified"] += 1
+                return True
+
+            digest = hashlib.sha256(content).hexdigest()
+            if self.feeds.get(url, {}).get("digest") == digest:
+                self.stats["digest_unchanged"] += 1
+                return True
+
+            self._pending[url] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "digest": digest,
+            }
+            return False
+
+    def commit(self, url: str):
+        """
+        本轮处理成功后提交暂存的校验值
+        :param url: 订阅地址
+        """
+        with self._lock:
+            pending = self._pending.pop(url, None)
+            if pending is None:
+                return
+            self.feeds[url] = pending
+            self._save()
+
+    def flush(self):
+        """
+        保存轮询统计，退出前调用；校验值在 commit 时已保存，未变化的轮询不写磁盘
+        """
+        with self._lock:
+            self._save()
+
+    def short_circuited(self) -> int:
+        """
+        :return: 被短路（304 或摘要未变化）的轮询次数
+        """
+        return self.stats["not_modified"] + self.stats["digest_unchanged"]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import difflib
+import hashlib
+import re
+from html import escape
+
+from Analysis.compaction import html_to_text
+
+# 段落标题行，如 "[地图]"
+SECTION_LINE = re.compile(r"^\[.+\]$")
+
+
+def normalize_description(description: str) -> list:
+    """
+    将新闻描述规范化为文本行，忽略 HTML 标记与空白差异
+    :param description: 新闻描述 HTML
+    :return: 文本行列表
+    """
+    return [line.rstrip() for line in html_to_text(description or "").split("\n") if line.strip()]
+
+
+def content_fingerprint(news: dict) -> str:
+    """
+    新闻内容指纹，描述只有 HTML 标记或空白变化时指纹不变
+    :param news: 新闻字典
+    :return: 指纹
+    """
+    text = "\n".join(" ".join(line.split()) for line in normalize_description(news.get("description")))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def changed_sections(old_description: str, new_description: str) -> list:
+    """
+    按段落比较新旧描述，找出新增或修改的行
+    :param old_description: 原描述 HTML
+    :param new_description: 新描述 HTML
+    :return: [(段落标题, [新增或修改的行])]，按新描述中的顺序排列，没有段落标题的行归入空标题
+    """
+    old_lines = normalize_description(old_description)
+    new_lines = normalize_description(new_description)
+
+    # 每一行所属的段落标题
+    sections = []
+    current = ""
+    for line in new_lines:
+        if SECTION_LINE.match(line):
+            current = line
+        sections.append(current)
+
+    changes = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag not in ("insert", "replace"):
+            continue
+        for index in range(j1, j2):
+            line = new_lines[index]
+            if SECTION_LINE.match(line):
+                continue
+            if not changes or changes[-1][0] != sections[index]:
+                changes.append((sections[index], []))
+            changes[-1][1].append(line)
+    return changes
+
+
+def format_changes(changes: list) -> str:
+    """
+    将 changed_sections 的结果转换为新闻描述 HTML
+    :param changes: changed_sections 的返回值
+    :return: 只包含新增或修改内容的描述
+    """
+    parts = []
+    for section, lines in changes:
+        if section:
+            parts.append(escape(section))
+        parts.extend(escape(line) for line in lines)
+    return "<br>".join(parts)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+
+def default_owner() -> str:
+    """
+    :return: 当前进程的实例名，主机名 + 进程号 + 随机后缀，重启后不会沿用旧实例的租约
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class LeaseCoordinator(object):
+    """
+    基于 SQLite 租约表的多实例协调
+    多个实例共用同一数据库文件（同一主机或共享卷），每个实例定期登记心跳；
+    数据库使用 DELETE 日志模式，依赖文件锁而不是 WAL 所需的同一主机共享内存，共享卷需提供可靠的文件锁；
+    每个订阅源按最高随机权重（rendezvous hashing）分配给一个存活实例，实例增减时只迁移少量订阅源；
+    轮询前还需取得该订阅源的租约，成员视图短暂不一致时也不会有两个实例同时检测同一订阅源。
+    实例失联后，其心跳与租约最迟在 ttl 秒后过期，订阅源由其他实例接管
+    """
+    # 数据库路径
+    db_path: str
+    # 当前实例名
+    owner: str
+    # 心跳与租约的有效期（秒）
+    ttl: float
+
+    def __init__(self, db_path: str, owner: str = None, ttl: float = 60):
+        self.db_path = db_path
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        # WAL 依赖同一主机上的共享内存，多个主机通过共享卷访问时加锁不可靠
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS members (owner TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._members = []
+        self._members_at = 0.0
+        self._heartbeat_thread = None
+        self._stop_event = threading.Event()
+
+    def heartbeat(self) -> list:
+        """
+        登记心跳、续约持有的租约并清理过期实例
+        :return: 存活实例列表
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO members (owner, expires_at) VALUES (?, ?)", (self.owner, now + self.ttl)
+                )
+                self._conn.execute("DELETE FROM members WHERE expires_at <= ?", (now,))
+                # 续约持有的租约，单次处理耗时超过 ttl 时租约也不会过期被接管
+                self._conn.execute(
+                    "UPDATE leases SET expires_at = ? WHERE owner = ? AND expires_at > ?",
+                    (now + self.ttl, self.owner, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            members = [row[0] for row in self._conn.execute("SELECT owner FROM members ORDER BY owner")]
+            if members != self._members:
+                self.logger.info(f"存活实例: {', '.join(members)}")
+            self._members = members
+            self._members_at = now
+        return members
+
+    def members(self) -> list:
+        """
+        :return: 存活实例列表，超过 ttl / 3 未刷新时重新登记心跳
+        """
+        if time.time() - self._members_at > self.ttl / 3:
+            return self.heartbeat()
+        return self._members
+
+    @staticmethod
+    def _weight(name: str, owner: str) -> bytes:
+        return hashlib.sha1(f"{name}\n{owner}".encode("utf-8")).digest()
+
+    def assigned_owner(self, name: str) -> str:
+        """
+        :param name: 资源名，如订阅地址
+        :return: 负责该资源的实例
+        """
+        members = self.members() or [self.owner]
+        return max(members, key=lambda owner: self._weight(name, owner))
+
+    def acquire(self, name: str) -> bool:
+        """
+        取得或续约租约，租约由其他实例持有且未过期时失败
+        :param name: 资源名
+        :return: 是否持有租约
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+                acquired = row is None or row[0] == self.owner or row[1] <= now
+                if acquired:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                        (name, self.owner, now + self.ttl),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if acquired and row is not None and row[0] != self.owner:
+            self.logger.info(f"已接管{row[0]}的租约: {name}")
+        return acquired
+
+    def release(self, name: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.owner))
+
+    def should_run(self, name: str) -> bool:
+        """
+        判断当前实例是否负责该资源：资源分配给当前实例且取得了租约
+        :param name: 资源名
+        :return: 是否由当前实例处理
+        """
+        if self.assigned_owner(name) != self.owner:
+            self.release(name)
+            return False
+        return self.acquire(name)
+
+    def _run_heartbeat(self):
+        while not self._stop_event.wait(self.ttl / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                self.logger.error(f"登记心跳失败: {e}")
+
+    def start(self):
+        """
+        在后台线程定期登记心跳，定时任务模式下使用
+        """
+        self.heartbeat()
+        self._heartbeat_thread = threading.Thread(target=self._run_heartbeat, name="lease-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop(self):
+        """
+        停止心跳并释放当前实例的全部租约，其他实例无需等待过期即可接管
+        """
+        self._stop_event.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+            self._conn.execute("DELETE FROM members WHERE owner = ?", (self.owner,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
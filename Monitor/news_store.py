@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from .fingerprint import content_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def news_key(news: dict) -> str:
+    """
+    新闻标识：优先使用链接或 guid，都没有时使用发布时间；
+    同一时间发布的不同新闻不会被合并，编辑过的新闻标识不变
+    :param news: 新闻字典
+    :return: 标识
+    """
+    return news.get("link") or news.get("guid") or news["pubDate"]
+
+
+class KnownNews(object):
+    """
+    某个订阅源已保存新闻的视图，支持 `key in known` 的 O(1) 查询，
+    `known.get(key)` 返回已保存的内容指纹，用于一次比较判断新闻是否被编辑
+    """
+
+    def __init__(self, store, feed_url: str):
+        self.store = store
+        self.feed_url = feed_url
+
+    def __contains__(self, key):
+        return self.store.contains(self.feed_url, key)
+
+    def get(self, key, default=None):
+        fingerprint = self.store.fingerprint(self.feed_url, key)
+        return default if fingerprint is None else fingerprint
+
+    def __bool__(self):
+        return True
+
+
+class NewsStore(object):
+    """
+    新闻存储后端接口
+    """
+
+    def known(self, feed_url: str) -> KnownNews:
+        return KnownNews(self, feed_url)
+
+    def contains(self, feed_url: str, key: str) -> bool:
+        raise NotImplementedError
+
+    def fingerprint(self, feed_url: str, key: str):
+        """
+        :return: 已保存新闻的内容指纹，新闻不存在时返回 None
+        """
+        raise NotImplementedError
+
+    def fingerprints(self, feed_url: str, keys) -> dict:
+        """
+        批量读取已保存新闻的内容指纹
+        :param feed_url: 订阅地址
+        :param keys: 新闻标识列表
+        :return: {标识: 内容指纹}，不包含未保存的新闻
+        """
+        fingerprints = {}
+        for key in keys:
+            fingerprint = self.fingerprint(feed_url, key)
+            if fingerprint is not None:
+                fingerprints[key] = fingerprint
+        return fingerprints
+
+    def get(self, feed_url: str, key: str):
+        """
+        :return: 已保存的新闻，不存在时返回 None
+        """
+        raise NotImplementedError
+
+    def update(self, feed_url: str, news_items: list) -> int:
+        """
+        以新内容替换已保存的新闻，用于新闻被编辑后
+        :param feed_url: 订阅地址
+        :param news_items: 新闻列表
+        :return: 实际更新条数
+        """
+        raise NotImplementedError
+
+    def add(self, feed_url: str, news_items: list) -> int:
+        """
+        追加新闻，已存在的新闻会被忽略
+        :param feed_url: 订阅地址
+        :param news_items: 新闻列表
+        :return: 实际写入条数
+        """
+        raise NotImplementedError
+
+    def items(self, feed_url: str = None):
+        """
+        按保存顺序倒序遍历新闻
+        :param feed_url: 订阅地址，为空时遍历全部
+        """
+        raise NotImplementedError
+
+    def count(self, feed_url: str = None) -> int:
+        raise NotImplementedError
+
+    def position(self) -> int:
+        """
+        :return: 当前的写入位置，之后保存的新闻位置更大，用于增量遍历
+        """
+        raise NotImplementedError
+
+    def items_since(self, position: int):
+        """
+        按保存顺序遍历写入位置在 position 之后的新闻
+        :param position: position() 的返回值，为 0 时遍历全部
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonNewsStore(NewsStore):
+    """
+    旧版 news.json 存储，每次写入重写整个文件，仅适合单订阅源、少量历史；
+    不区分订阅源，各方法忽略 feed_url，配置多个订阅源时 init 会拒绝启动
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._news = load_json_news(file_path)
+        # {标识: 新闻}，指纹在首次比较时计算
+        self._by_key = {news_key(news): news for news in self._news}
+        self._fingerprints = {}
+
+    def contains(self, feed_url: str, key: str) -> bool:
+        return key in self._by_key
+
+    def fingerprint(self, feed_url: str, key: str):
+        news = self._by_key.get(key)
+        if news is None:
+            return None
+        if key not in self._fingerprints:
+            self._fingerprints[key] = content_fingerprint(news)
+        return self._fingerprints[key]
+
+    def get(self, feed_url: str, key: str):
+        return self._by_key.get(key)
+
+    def _save(self):
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._news, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.file_path)
+
+    def add(self, feed_url: str, news_items: list) -> int:
+        with self._lock:
+            added = [news for news in news_items if news_key(news) not in self._by_key]
+            if not added:
+                return 0
+            self._news.extend(added)
+            self._by_key.update((news_key(news), news) for news in added)
+            self._save()
+            return len(added)
+
+    def update(self, feed_url: str, news_items: list) -> int:
+        with self._lock:
+            updated = 0
+            for news in news_items:
+                key = news_key(news)
+                stored = self._by_key.get(key)
+                if stored is None:
+                    continue
+                stored.update(news)
+                self._fingerprints.pop(key, None)
+                updated += 1
+            if updated:
+                self._save()
+            return updated
+
+    def items(self, feed_url: str = None):
+        return iter(list(reversed(self._news)))
+
+    def count(self, feed_url: str = None) -> int:
+        return len(self._news)
+
+    def position(self) -> int:
+        return len(self._news)
+
+    def items_since(self, position: int):
+        return iter(self._news[position:])
+
+
+class SqliteNewsStore(NewsStore):
+    """
+    SQLite 新闻存储
+    以 (订阅地址, 标识) 为主键，查询是否已存在与读取内容指纹均为索引查找，新增新闻在单个事务中追加写入
+    """
+
+    def __init__(self, db_path: str, journal_mode: str = "WAL"):
+        """
+        :param db_path: 数据库路径
+        :param journal_mode: SQLite 日志模式，多个主机通过共享卷共用数据库时使用 DELETE
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        if journal_mode.upper() == "WAL":
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS news ("
+                "feed_url TEXT NOT NULL, news_key TEXT NOT NULL, title TEXT, link TEXT, "
+                "pub_date TEXT, description TEXT, saved_at REAL NOT NULL, "
+                "PRIMARY KEY (feed_url, news_key))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(news)")}
+            if "fingerprint" not in columns:
+                # 旧版以发布时间为标识且没有内容指纹，改用链接作为标识，指纹在首次比较时补全
+                self._conn.execute("ALTER TABLE news ADD COLUMN fingerprint TEXT")
+                self._conn.execute(
+                    "UPDATE OR IGNORE news SET news_key = link WHERE link IS NOT NULL AND link != ''"
+                )
+
+    def contains(self, feed_url: str, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM news WHERE feed_url = ? AND news_key = ?", (feed_url, key)
+            ).fetchone()
+        return row is not None
+
+    def fingerprint(self, feed_url: str, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, description FROM news WHERE feed_url = ? AND news_key = ?", (feed_url, key)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] is not None:
+            return row[0]
+        # 旧版保存的新闻没有指纹，计算后写回
+        fingerprint = content_fingerprint({"description": row[1]})
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE news SET fingerprint = ? WHERE feed_url = ? AND news_key = ?", (fingerprint, feed_url, key)
+            )
+        return fingerprint
+
+    def get(self, feed_url: str, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT title, link, pub_date, description FROM news WHERE feed_url = ? AND news_key = ?",
+                (feed_url, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"title": row[0], "link": row[1], "pubDate": row[2], "description": row[3]}
+
+    def add(self, feed_url: str, news_items: list) -> int:
+        now = time.time()
+        rows = [
+            (feed_url, news_key(news), news.get("title"), news.get("link"),
+             news.get("pubDate"), news.get("description"), content_fingerprint(news), now)
+            for news in news_items
+        ]
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO news "
+                "(feed_url, news_key, title, link, pub_date, description, fingerprint, saved_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return cursor.rowcount
+
+    def update(self, feed_url: str, news_items: list) -> int:
+        rows = [
+            (news.get("title"), news.get("description"), content_fingerprint(news), feed_url, news_key(news))
+            for news in news_items
+        ]
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "UPDATE news SET title = ?, description = ?, fingerprint = ? WHERE feed_url = ? AND news_key = ?",
+                rows,
+            )
+        return cursor.rowcount
+
+    def items(self, feed_url: str = None):
+        sql = "SELECT title, link, pub_date, description FROM news"
+        params = ()
+        if feed_url is not None:
+            sql += " WHERE feed_url = ?"
+            params = (feed_url,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY rowid DESC", params).fetchall()
+        for title, link, pub_date, description in rows:
+            yield {"title": title, "link": link, "pubDate": pub_date, "description": description}
+
+    def count(self, feed_url: str = None) -> int:
+        with self._lock:
+            if feed_url is None:
+                return self._conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM news WHERE feed_url = ?", (feed_url,)
+            ).fetchone()[0]
+
+    def position(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM news").fetchone()[0]
+
+    def items_since(self, position: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, link, pub_date, description FROM news WHERE rowid > ? ORDER BY rowid", (position,)
+            ).fetchall()
+        for title, link, pub_date, description in rows:
+            yield {"title": title, "link": link, "pubDate": pub_date, "description": description}
+
+    def get_meta(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def load_json_news(file_path: str) -> list:
+    """
+    读取旧版 news.json
+    :param file_path: 文件路径
+    :return: 新闻列表，文件不存在或为空时返回空列表
+    """
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if not content.strip():
+        return []
+    return json.loads(content)
+
+
+def _pub_timestamp(news: dict) -> float:
+    try:
+        return parsedate_to_datetime(news["pubDate"]).timestamp()
+    except (TypeError, ValueError, KeyError):
+        return 0.0
+
+
+def import_json_news(store: SqliteNewsStore, file_path: str, feed_url: str) -> int:
+    """
+    一次性将旧版 news.json 导入 SQLite 存储，导入过的文件不会重复导入
+    :param store: SQLite 存储
+    :param file_path: news.json 路径
+    :param feed_url: 新闻所属订阅地址
+    :return: 导入条数
+    """
+    meta_key = f"imported:{os.path.abspath(file_path)}"
+    if store.get_meta(meta_key) or not os.path.exists(file_path):
+        return 0
+    try:
+        news_items = load_json_news(file_path)
+    except Exception as e:
+        logger.error(f"读取待导入的新闻文件失败: {e}")
+        return 0
+    # 按发布时间从旧到新写入，保持 rowid 与时间顺序一致
+    news_items.sort(key=_pub_timestamp)
+    imported = store.add(feed_url, news_items)
+    store.set_meta(meta_key, str(time.time()))
+    logger.info(f"已从{file_path}导入{imported}条新闻")
+    return imported
+
+
+def create_news_store(data_config: dict, feed_url: str, journal_mode: str = "WAL") -> NewsStore:
+    """
+    根据配置创建新闻存储
+    :param data_config: CONFIG["data"]
+    :param feed_url: 旧版 news.json 中新闻所属的订阅地址
+    :param journal_mode: SQLite 日志模式
+    :return: 新闻存储
+    """
+    backend = data_config.get("backend", "sqlite")
+    json_file_path = data_config.get("json_file_path", "news.json")
+    if backend == "json":
+        return JsonNewsStore(json_file_path)
+    if backend != "sqlite":
+        raise ValueError(f"不支持的新闻存储后端: {backend}")
+    store = SqliteNewsStore(data_config.get("db_path", "news.db"), journal_mode=journal_mode)
+    import_json_news(store, json_file_path, feed_url)
+    return store
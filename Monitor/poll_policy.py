@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import logging
+import statistics
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# 一周按小时划分的时段数
+HOURS_PER_WEEK = 7 * 24
+
+
+def pub_timestamp(pub_date: str):
+    """
+    解析 RSS pubDate
+    :param pub_date: RFC 2822 格式时间
+    :return: 时间戳，无法解析时返回 None
+    """
+    try:
+        return parsedate_to_datetime(pub_date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def hour_of_week(timestamp: float) -> int:
+    """
+    :param timestamp: 时间戳
+    :return: UTC 下一周中的第几个小时（周一 0 点为 0）
+    """
+    t = time.gmtime(timestamp)
+    return t.tm_wday * 24 + t.tm_hour
+
+
+class AdaptivePollPolicy(object):
+    """
+    自适应轮询间隔
+    根据已保存新闻的 pubDate 统计每周各小时的发布概率：
+        1. 最近有新发布时按最短间隔轮询（补丁常连续发布）
+        2. 处于高概率发布时段时按 hot_interval 轮询
+        3. 其余时间每次未发现新闻间隔翻倍，直到 max_interval
+    所有间隔都限制在 [min_interval, max_interval] 内
+    """
+    # 最短间隔（秒）
+    min_interval: float
+    # 最长间隔（秒）
+    max_interval: float
+    # 高概率时段的间隔（秒）
+    hot_interval: float
+    # 最近发布判定窗口（秒）
+    recent_window: float
+    # 时段发布概率超过平均值的倍数时视为高概率时段
+    hot_ratio: float
+    # 开始判定高概率时段所需的最少历史条数
+    min_samples: int
+
+    def __init__(self, min_interval: float = 20, max_interval: float = 900, hot_interval: float = 30,
+                 recent_window: float = 7200, hot_ratio: float = 2.0, min_samples: int = 5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.hot_interval = hot_interval
+        self.recent_window = recent_window
+        self.hot_ratio = hot_ratio
+        self.min_samples = min_samples
+        # 每个订阅源的状态 {url: {"histogram", "samples", "last_published", "empty_polls", "seen"}}
+        self._feeds = {}
+        # 检测延迟（发现时间 - pubDate）样本，用于与固定间隔对比
+        self.detection_latencies = []
+        self.polls = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _state(self, feed_url: str) -> dict:
+        state = self._feeds.get(feed_url)
+        if state is None:
+            state = {"histogram": [0] * HOURS_PER_WEEK, "samples": 0, "last_published": None, "empty_polls": 0,
+                     "seen": set()}
+            self._feeds[feed_url] = state
+        return state
+
+    def _record(self, state: dict, timestamp: float) -> bool:
+        # 推送失败的新闻会在下次轮询再次出现，只统计一次
+        if timestamp in state["seen"]:
+            return False
+        state["seen"].add(timestamp)
+        state["histogram"][hour_of_week(timestamp)] += 1
+        state["samples"] += 1
+        if state["last_published"] is None or timestamp > state["last_published"]:
+            state["last_published"] = timestamp
+        return True
+
+    def learn(self, feed_url: str, pub_dates):
+        """
+        从历史 pubDate 学习发布时段分布
+        :param feed_url: 订阅地址
+        :param pub_dates: pubDate 可迭代对象
+        """
+        with self._lock:
+            state = self._state(feed_url)
+            for pub_date in pub_dates:
+                timestamp = pub_timestamp(pub_date)
+                if timestamp is not None:
+                    self._record(state, timestamp)
+
+    def _is_hot(self, state: dict, timestamp: float) -> bool:
+        if state["samples"] < self.min_samples:
+            return False
+        histogram = state["histogram"]
+        bucket = hour_of_week(timestamp)
+        # 与相邻时段做平滑，避免历史较少时分布过于尖锐
+        weight = histogram[bucket] + 0.5 * (histogram[bucket - 1] + histogram[(bucket + 1) % HOURS_PER_WEEK])
+        share = weight / (2 * state["samples"])
+        return share >= self.hot_ratio / HOURS_PER_WEEK
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def next_interval(self, feed_url: str, news_items: list) -> float:
+        """
+        根据本次轮询结果计算下次轮询间隔
+        :param feed_url: 订阅地址
+        :param news_items: 本次发现的新新闻
+        :return: 间隔（秒）
+        """
+        now = time.time()
+        with self._lock:
+            self.polls += 1
+            state = self._state(feed_url)
+            if news_items:
+                state["empty_polls"] = 0
+                for news in news_items:
+                    timestamp = pub_timestamp(news.get("pubDate"))
+                    if timestamp is None or not self._record(state, timestamp):
+                        continue
+                    latency = now - timestamp
+                    self.logger.info(f"检测延迟{latency:.0f}秒: {news.get('title')}")
+                    # 首次运行或长时间停机后补检测到的旧新闻不计入统计
+                    if latency < 86400:
+                        self.detection_latencies.append(latency)
+            else:
+                state["empty_polls"] += 1
+
+            if state["last_published"] is not None and now - state["last_published"] < self.recent_window:
+                interval, reason = self.min_interval, "近期有新发布"
+            elif self._is_hot(state, now) or self._is_hot(state, now + 3600):
+                interval, reason = self.hot_interval, "处于高概率发布时段"
+            else:
+                interval = self.min_interval * (2 ** min(state["empty_polls"], 16))
+                reason = f"连续{state['empty_polls']}次无新发布，指数退避"
+            interval = self._clamp(interval)
+
+        self.logger.info(f"下次轮询间隔{interval:.0f}秒，原因: {reason}")
+        return interval
+
+    def median_detection_latency(self):
+        """
+        :return: 检测延迟中位数（秒），无样本时返回 None
+        """
+        with self._lock:
+            if not self.detection_latencies:
+                return None
+            return statistics.median(self.detection_latencies)
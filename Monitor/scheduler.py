@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncScheduler(object):
+    """
+    基于 asyncio 的多订阅源调度器
+    每个订阅源一个独立的轮询任务，按各自的间隔执行，同一订阅源不会重叠执行；
+    检测（获取/解析/比对）在有并发上限的轮询线程池中执行，
+    分析与推送等耗时步骤放到单独的处理线程池，不会占用其他订阅源的轮询名额
+    """
+    # 订阅源列表，每项包含 name / url / check_interval
+    feeds: list
+    # 同时进行检测的订阅源上限
+    max_concurrency: int
+    # 同时进行分析与推送的订阅源上限
+    max_workers: int
+
+    def __init__(self, feeds: list, detect, handle, max_concurrency: int = 4, max_workers: int = 2,
+                 next_interval=None):
+        """
+        :param feeds: 订阅源列表
+        :param detect: 检测函数 detect(feed) -> 新闻列表，阻塞调用
+        :param handle: 处理函数 handle(feed, news_items)，阻塞调用
+        :param max_concurrency: 同时进行检测的订阅源上限
+        :param max_workers: 同时进行分析与推送的订阅源上限
+        :param next_interval: 计算下次轮询间隔的函数 next_interval(feed, news_items) -> 秒，
+                              为空时使用订阅源的 check_interval
+        """
+        self.feeds = feeds
+        self.detect = detect
+        self.handle = handle
+        self.max_concurrency = max_concurrency
+        self.max_workers = max_workers
+        self.next_interval = next_interval
+        self.logger = logging.getLogger(__name__)
+        self._stop_event = None
+        self._semaphore = None
+        self._poll_executor = None
+        self._work_executor = None
+
+    def stop(self):
+        """
+        请求停止调度，正在执行的检测与推送会完成后再退出
+        """
+        if self._stop_event is not None and not self._stop_event.is_set():
+            self.logger.info("收到停止信号，等待当前任务完成")
+            self._stop_event.set()
+
+    def _interval_for(self, feed: dict, news_items: list) -> float:
+        if self.next_interval is not None:
+            return self.next_interval(feed, news_items)
+        return feed["check_interval"]
+
+    async def _run_feed(self, feed: dict):
+        loop = asyncio.get_running_loop()
+        while not self._stop_event.is_set():
+            started_at = time.monotonic()
+            news_items = []
+            try:
+                async with self._semaphore:
+                    news_items = await loop.run_in_executor(self._poll_executor, self.detect, feed)
+                if news_items:
+                    await loop.run_in_executor(self._work_executor, self.handle, feed, news_items)
+            except Exception as e:
+                self.logger.error(f"订阅源[{feed['name']}]执行出错: {e}", exc_info=True)
+
+            # 间隔从本次轮询开始计算，处理耗时不再额外推迟下一次轮询
+            interval = self._interval_for(feed, news_items)
+            delay = max(0.0, interval - (time.monotonic() - started_at))
+            self.logger.info(f"订阅源[{feed['name']}]等待{delay:.0f}秒后再次检查")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows 不支持 add_signal_handler，由 KeyboardInterrupt 处理
+                pass
+
+    async def run(self):
+        self._stop_event = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._poll_executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="poll")
+        self._work_executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="work")
+        self._install_signal_handlers()
+        self.logger.info(f"启动定时任务，共{len(self.feeds)}个订阅源")
+        try:
+            await asyncio.gather(*(self._run_feed(feed) for feed in self.feeds))
+        finally:
+            self._poll_executor.shutdown(wait=True)
+            self._work_executor.shutdown(wait=True)
+            self.logger.info("定时任务已停止")
@@ -1 +1,6 @@
-from .wx_bot_push import WxComBot
\ No newline at end of file
+from .wx_bot_push import WxComBot
+from .media_cache import MediaCache
+from .notifiers import Notifier, NotifierDispatcher, create_notifiers, register_notifier
+from .outbox import DeliveryWorker, Outbox
+from .payload import encode_payload, split_message
+from .token_cache import TokenManager
\ No newline at end of file
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# 企业微信临时素材有效期为 3 天，预留 1 小时余量
+MEDIA_TTL = 3 * 24 * 3600 - 3600
+
+
+class MediaCache(object):
+    """
+    企业微信临时素材缓存
+    以 文件内容摘要 + 素材类型 为键保存上传返回的 media_id 与上传时间，
+    文件内容未变化且未过期时复用 media_id，避免每次推送都重新上传
+    """
+    # 缓存文件路径
+    cache_path: str
+    # 素材有效期（秒）
+    ttl: int
+
+    def __init__(self, cache_path: str, ttl: int = MEDIA_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._entries = {}
+        # 文件摘要缓存 {path: (mtime, size, digest)}，文件未修改时不重复计算
+        self._digests = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"读取素材缓存失败: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            self.logger.warning(f"保存素材缓存失败: {e}")
+
+    def file_digest(self, file_path: str) -> str:
+        """
+        计算文件内容摘要，文件修改时间与大小未变化时直接返回上次结果
+        :param file_path: 文件路径
+        :return: sha256 摘要
+        """
+        stat = os.stat(file_path)
+        cached = self._digests.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                sha256.update(block)
+        digest = sha256.hexdigest()
+        self._digests[file_path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    @staticmethod
+    def _key(digest: str, media_type: str, namespace: str) -> str:
+        return f"{namespace}:{media_type}:{digest}"
+
+    def get(self, digest: str, media_type: str, namespace: str = "") -> str:
+        """
+        获取仍在有效期内的 media_id
+        :param digest: 文件内容摘要
+        :param media_type: 素材类型，如 image
+        :param namespace: 命名空间，不同企业的素材互不通用，一般传 corp_id
+        :return: media_id，不存在或已过期时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(digest, media_type, namespace))
+        if not entry or time.time() - entry["uploaded_at"] >= self.ttl:
+            return None
+        return entry["media_id"]
+
+    def put(self, digest: str, media_type: str, media_id: str, namespace: str = ""):
+        """
+        保存上传得到的 media_id
+        :param digest: 文件内容摘要
+        :param media_type: 素材类型
+        :param media_id: 上传返回的 media_id
+        :param namespace: 命名空间
+        """
+        with self._lock:
+            now = time.time()
+            # 顺带清理过期条目
+            self._entries = {
+                key: entry for key, entry in self._entries.items()
+                if now - entry["uploaded_at"] < self.ttl
+            }
+            self._entries[self._key(digest, media_type, namespace)] = {
+                "media_id": media_id,
+                "uploaded_at": now,
+            }
+            self._save()
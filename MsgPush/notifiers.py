@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from Common.metrics import stage_timer
+from Common.transport import get_transport
+
+from .outbox import Unconfirmed
+from .token_cache import WXCOM_API_BASE
+from .wx_bot_push import WxComBot
+
+
+class Notifier(object):
+    """
+    推送渠道接口
+    send 接收统一的消息字典 {"title", "content", "url", "news_items", "articles"}，失败时抛出异常，
+    articles 为按新闻拆分的文章列表 [{"title", "content", "url"}]，content 为合并后的全文
+    """
+    # 渠道名称，对应 outbox.channels 中的名称
+    name: str
+    # 单次请求的读取超时（秒）
+    timeout: float
+    # 重复推送同一消息时是否由服务端去重；为 False 时读取超时（请求可能已送达）不再重试，避免重复推送
+    idempotent = False
+
+    def __init__(self, name: str, timeout: float = 30):
+        self.name = name
+        self.timeout = timeout
+
+    def send(self, message: dict):
+        raise NotImplementedError
+
+
+class WxComNotifier(Notifier):
+    """
+    企业微信应用图文消息，同一应用的多个实例共享 access_token
+    开启企业微信的重复消息检查，重试时已送达的消息不会重复推送
+    """
+    idempotent = True
+
+    def __init__(self, name: str, corp_id: str, corp_secret: str, agent_id: str, to_party: str = None,
+                 to_user: str = None, to_tag: str = None, token_cache_path: str = None, thumb_media_id=None,
+                 author: str = "cs2bot", rate_limit: float = 0.5, rate_burst: int = 10,
+                 api_base: str = WXCOM_API_BASE, timeout: float = 30, duplicate_check_interval: int = 14400):
+        """
+        :param name: 渠道名称
+        :param corp_id: 企业 id
+        :param corp_secret: 应用的凭证密钥
+        :param agent_id: 应用 id
+        :param to_party: 接收消息的部门
+        :param to_user: 接收消息的成员
+        :param to_tag: 接收消息的标签
+        :param token_cache_path: access_token 缓存文件路径
+        :param thumb_media_id: 获取缩略图 media_id 的函数 thumb_media_id(bot) -> media_id
+        :param author: 图文消息作者
+        :param rate_limit: 每秒允许发送的消息数，同一应用共享
+        :param rate_burst: 允许的突发消息数
+        :param api_base: 企业微信接口地址
+        :param timeout: 单次请求的读取超时（秒）
+        :param duplicate_check_interval: 企业微信重复消息检查的时间间隔（秒），最大 4 小时
+        """
+        super().__init__(name, timeout)
+        self.agent_id = agent_id
+        self.duplicate_check_interval = duplicate_check_interval
+        self.to_party = to_party
+        self.to_user = to_user
+        self.to_tag = to_tag
+        self.thumb_media_id = thumb_media_id
+        self.author = author
+        self.bot = WxComBot(corp_id, corp_secret, token_cache_path=token_cache_path, rate_limit=rate_limit,
+                            rate_burst=rate_burst, api_base=api_base)
+
+    def send(self, message: dict):
+        media_id = self.thumb_media_id(self.bot) if self.thumb_media_id is not None else None
+        articles = message.get("articles") or [
+            {"title": message["title"], "content": message["content"], "url": message["url"]}
+        ]
+        # 每篇文章保留各自的原文链接，超过 8 篇时拆分为多条消息
+        self.bot.send_mpnews_batched(
+            agentid=self.agent_id,
+            ouser=self.to_user,
+            toparty=self.to_party,
+            totag=self.to_tag,
+            articles=[
+                {
+                    "title": article["title"],
+                    "thumb_media_id": media_id,
+                    "author": self.author,
+                    "content_source_url": article["url"],
+                    "content": article["content"],
+                    "digest": "",
+                }
+                for article in articles
+            ],
+            enable_duplicate_check=1,
+            duplicate_check_interval=self.duplicate_check_interval,
+            timeout=(get_transport().connect_timeout, self.timeout),
+        )
+
+
+class SpugNotifier(Notifier):
+    """
+    Spug 推送，仅发送提醒文本
+    """
+
+    def __init__(self, name: str, url: str, content: str = "CS2已发布更新,请查看微信分析消息", timeout: float = 10):
+        super().__init__(name, timeout)
+        self.url = url
+        self.content = content
+
+    def send(self, message: dict):
+        transport = get_transport()
+        # Spug 的 GET 接口会发送提醒，不是幂等请求，失败时不在传输层重试
+        response = transport.get(
+            self.url, params={"content": self.content}, timeout=(transport.connect_timeout, self.timeout),
+            retry=False,
+        )
+        response.raise_for_status()
+
+
+class WebhookNotifier(Notifier):
+    """
+    通用 Webhook，以 JSON 形式 POST 标题、内容、链接与文章列表
+    """
+
+    def __init__(self, name: str, url: str, headers: dict = None, timeout: float = 10):
+        super().__init__(name, timeout)
+        self.url = url
+        self.headers = headers or {}
+
+    def send(self, message: dict):
+        transport = get_transport()
+        body = {
+            "title": message["title"],
+            "content": message["content"],
+            "url": message["url"],
+            "articles": message.get("articles", []),
+        }
+        response = transport.post(
+            self.url,
+            data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json", **self.headers},
+            timeout=(transport.connect_timeout, self.timeout),
+        )
+        response.raise_for_status()
+
+
+# 渠道类型注册表 {type: factory(name, **options) -> Notifier}
+NOTIFIER_TYPES = {
+    "wx": WxComNotifier,
+    "spug": SpugNotifier,
+    "webhook": WebhookNotifier,
+}
+
+
+def register_notifier(notifier_type: str, factory):
+    """
+    注册新的渠道类型
+    :param notifier_type: 类型名称，对应配置中的 type
+    :param factory: 工厂函数 factory(name, **options) -> Notifier
+    """
+    NOTIFIER_TYPES[notifier_type] = factory
+
+
+def create_notifiers(channel_configs: list, **extra_options) -> dict:
+    """
+    根据配置创建推送渠道
+    :param channel_configs: 渠道配置列表，每项包含 name / type 及该类型的参数
+    :param extra_options: 按类型附加的参数 {type: {option: value}}，如企业微信的 thumb_media_id
+    :return: {name: Notifier}
+    """
+    notifiers = {}
+    for channel_config in channel_configs:
+        options = dict(channel_config)
+        notifier_type = options.pop("type")
+        name = options.pop("name", notifier_type)
+        if not options.pop("enabled", True):
+            continue
+        if notifier_type not in NOTIFIER_TYPES:
+            raise ValueError(f"不支持的推送渠道类型: {notifier_type}")
+        options.update(extra_options.get(notifier_type, {}))
+        notifiers[name] = NOTIFIER_TYPES[notifier_type](name, **options)
+    return notifiers
+
+
+def _is_read_timeout(error: BaseException) -> bool:
+    # 渠道可能将请求异常包装为其他异常，沿异常链查找
+    while error is not None:
+        if isinstance(error, requests.ReadTimeout):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class NotifierDispatcher(object):
+    """
+    多渠道并发推送
+    每个渠道在线程池中独立推送并单独计时，慢渠道不会拖慢其他渠道的推送
+    """
+    # 已配置的渠道 {name: Notifier}
+    notifiers: dict
+
+    def __init__(self, notifiers: dict, max_workers: int = 8):
+        self.notifiers = notifiers
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+
+    def _send(self, notifier: Notifier, message: dict) -> float:
+        started = time.monotonic()
+        with stage_timer("push", channel=notifier.name):
+            notifier.send(message)
+        return time.monotonic() - started
+
+    def dispatch(self, message: dict, channels: list = None) -> dict:
+        """
+        并发推送到多个渠道
+        :param message: 消息 {"title", "content", "url", "news_items", "articles"}
+        :param channels: 渠道名称列表，为空时推送到全部渠道
+        :return: 每个渠道的结果 {name: 错误信息}，成功时为 None；
+                 不可安全重试的渠道读取超时（可能已送达）时为 Unconfirmed
+        """
+        if channels is None:
+            channels = list(self.notifiers)
+        results = {}
+        futures = {}
+        for name in channels:
+            notifier = self.notifiers.get(name)
+            if notifier is None:
+                results[name] = f"未配置的推送渠道: {name}"
+                continue
+            # 在调用方的上下文中推送，渠道的日志沿用当前的关联 id
+            futures[name] = self._executor.submit(contextvars.copy_context().run, self._send, notifier, message)
+
+        # 不设整体截止时间：放弃仍在执行的推送会在其稍后成功时被记为失败并重试，导致重复推送；
+        # 每个请求已有读取超时，限流排队的等待也不计为失败
+        for name, future in futures.items():
+            try:
+                elapsed = future.result()
+                results[name] = None
+                self.logger.info(f"渠道[{name}]推送成功，耗时{elapsed:.1f}秒")
+            except Exception as e:
+                if not self.notifiers[name].idempotent and _is_read_timeout(e):
+                    # 请求已发出但未收到响应，可能已送达，重试可能重复推送
+                    results[name] = Unconfirmed(f"读取超时，可能已送达: {e}")
+                    self.logger.warning(f"渠道[{name}]推送读取超时，结果未知: {e}")
+                    continue
+                results[name] = str(e) or type(e).__name__
+                self.logger.error(f"渠道[{name}]推送失败: {e}")
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from Common.log import log_correlation
+
+# 消息状态：已检测 -> 分析中 -> 已分析 -> 已送达 / 失败
+DETECTED = "detected"
+ANALYZING = "analyzing"
+ANALYZED = "analyzed"
+DELIVERED = "delivered"
+FAILED = "failed"
+# 渠道投递状态
+PENDING = "pending"
+# 请求已发出但结果未知（可能已送达），不再重试，不计为送达
+UNCONFIRMED = "unconfirmed"
+
+
+class Unconfirmed(str):
+    """
+    投递结果未知时的错误信息，如请求已发出但读取响应超时；
+    投递函数返回该类型时渠道记为未确认，不再重试以免重复推送
+    """
+
+
+class Outbox(object):
+    """
+    持久化发件箱
+    检测到的新闻先写入发件箱，分析结果与每个渠道的投递状态都保存在 SQLite 中，
+    失败时按指数退避重试，重试时直接使用已保存的分析结果；进程重启后从中断处继续
+    """
+    # 数据库路径
+    db_path: str
+    # 分析或投递的最大尝试次数
+    max_attempts: int
+    # 退避基数（秒），第 n 次失败后等待 backoff * 2^(n-1)
+    backoff: float
+    # 最长退避时间（秒）
+    max_backoff: float
+    # 分析中的消息超过该时间（秒）未完成时视为分析实例已退出，可被重新领取；为空时启动时重新排队全部分析中的消息
+    reclaim_after: float
+    # 投递领取后超过该时间（秒）未记录结果时视为投递实例已退出，重新到期
+    delivery_timeout: float
+    # 已送达或失败的消息保留时间（秒），为 0 或空时不清理
+    retention: float
+    # SQLite 日志模式，多个主机通过共享卷共用发件箱时使用 DELETE，WAL 依赖同一主机上的共享内存
+    journal_mode: str
+
+    def __init__(self, db_path: str, max_attempts: int = 8, backoff: float = 30, max_backoff: float = 3600,
+                 reclaim_after: float = None, delivery_timeout: float = 300, retention: float = 30 * 24 * 3600,
+                 journal_mode: str = "WAL"):
+        self.db_path = db_path
+        self.delivery_timeout = delivery_timeout
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reclaim_after = reclaim_after
+        self.journal_mode = journal_mode
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        if journal_mode.upper() == "WAL":
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, feed_url TEXT NOT NULL, news_items TEXT NOT NULL, "
+                "state TEXT NOT NULL, analysis TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_delivery ("
+                "outbox_id INTEGER NOT NULL, channel TEXT NOT NULL, state TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, last_error TEXT, "
+                "delivered_at REAL, PRIMARY KEY (outbox_id, channel))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox (state, next_attempt_at)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if "analyzed_at" not in columns:
+                # 记录分析完成时间，用于统计检测、分析与投递各阶段的延迟
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN analyzed_at REAL")
+            if "cycle_id" not in columns:
+                # 检测时的日志关联 id，分析与投递的日志沿用该 id
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN cycle_id TEXT")
+            # 上次退出时未完成的分析重新排队；多实例共用发件箱时其他实例可能正在分析，改为按超时重新领取
+            if reclaim_after is None:
+                self._conn.execute("UPDATE outbox SET state = ? WHERE state = ?", (DETECTED, ANALYZING))
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+
+    @staticmethod
+    def _entry(row) -> dict:
+        entry_id, feed_url, news_items, state, analysis, attempts, cycle_id = row
+        return {
+            "id": entry_id,
+            "feed_url": feed_url,
+            "news_items": json.loads(news_items),
+            "state": state,
+            "analysis": analysis,
+            "attempts": attempts,
+            "cycle_id": cycle_id,
+        }
+
+    def enqueue(self, feed_url: str, news_items: list, channels: list, cycle_id: str = None) -> int:
+        """
+        写入新检测到的新闻
+        :param feed_url: 订阅地址
+        :param news_items: 新闻列表，作为一条消息分析与投递
+        :param channels: 投递渠道列表
+        :param cycle_id: 检测时的日志关联 id，分析与投递时沿用
+        :return: 消息 id
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (feed_url, news_items, state, next_attempt_at, created_at, updated_at, cycle_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (feed_url, json.dumps(news_items, ensure_ascii=False), DETECTED, now, now, now, cycle_id),
+            )
+            entry_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO outbox_delivery (outbox_id, channel, state, next_attempt_at) VALUES (?, ?, ?, ?)",
+                [(entry_id, channel, PENDING, now) for channel in channels],
+            )
+        return entry_id
+
+    def claim_analysis(self, entry_id: int = None) -> dict:
+        """
+        领取一条待分析的消息，领取后状态变为分析中，不会被重复领取
+        :param entry_id: 指定消息 id，为空时领取最早到期的一条
+        :return: 消息，没有可领取的消息时返回 None
+        """
+        now = time.time()
+        # 超时未完成的分析视为可领取
+        stale_before = now - self.reclaim_after if self.reclaim_after is not None else float("-inf")
+        with self._lock, self._conn:
+            if entry_id is None:
+                row = self._conn.execute(
+                    "SELECT id FROM outbox WHERE (state = ? AND next_attempt_at <= ?) "
+                    "OR (state = ? AND updated_at <= ?) ORDER BY id LIMIT 1",
+                    (DETECTED, now, ANALYZING, stale_before),
+                ).fetchone()
+                if row is None:
+                    return None
+                entry_id = row[0]
+            # 条件更新保证多个线程或进程中只有一个能领取成功
+            cursor = self._conn.execute(
+                "UPDATE outbox SET state = ?, updated_at = ? "
+                "WHERE id = ? AND (state = ? OR (state = ? AND updated_at <= ?))",
+                (ANALYZING, now, entry_id, DETECTED, ANALYZING, stale_before),
+            )
+            if cursor.rowcount == 0:
+                return None
+            row = self._conn.execute(
+                "SELECT id, feed_url, news_items, state, analysis, attempts, cycle_id FROM outbox WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+        return self._entry(row)
+
+    def mark_analyzed(self, entry_id: int, analysis: str):
+        """
+        保存分析结果，之后各渠道可开始投递
+        :param entry_id: 消息 id
+        :param analysis: 分析结果
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, analysis = ?, updated_at = ?, analyzed_at = ? WHERE id = ?",
+                (ANALYZED, analysis, now, now, entry_id),
+            )
+
+    def analysis_failed(self, entry_id: int, error: str) -> bool:
+        """
+        记录分析失败并安排重试
+        :param entry_id: 消息 id
+        :param error: 错误信息
+        :return: 已达到最大尝试次数时返回 True，由调用方决定如何收尾
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            attempts = self._conn.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()[0] + 1
+            self._conn.execute(
+                "UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (DETECTED, attempts, now + self._retry_delay(attempts), error, now, entry_id),
+            )
+        return attempts >= self.max_attempts
+
+    def claim_deliveries(self) -> list:
+        """
+        领取已到重试时间的待投递渠道，领取后 delivery_timeout 内不会被其他线程或进程重复领取
+        :return: 领取到的待投递列表 [(消息, 渠道)]
+        """
+        now = time.time()
+        claimed = []
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT o.id, o.feed_url, o.news_items, o.state, o.analysis, d.attempts, o.cycle_id, d.channel, "
+                "d.next_attempt_at "
+                "FROM outbox_delivery d JOIN outbox o ON o.id = d.outbox_id "
+                "WHERE o.state = ? AND d.state = ? AND d.next_attempt_at <= ? ORDER BY o.id",
+                (ANALYZED, PENDING, now),
+            ).fetchall()
+            for row in rows:
+                # 条件更新保证同一渠道只有一个实例投递
+                cursor = self._conn.execute(
+                    "UPDATE outbox_delivery SET next_attempt_at = ? "
+                    "WHERE outbox_id = ? AND channel = ? AND state = ? AND next_attempt_at = ?",
+                    (now + self.delivery_timeout, row[0], row[7], PENDING, row[8]),
+                )
+                if cursor.rowcount:
+                    claimed.append((self._entry(row[:7]), row[7]))
+        return claimed
+
+    def _finish_if_done(self, entry_id: int, now: float):
+        states = {row[0] for row in self._conn.execute(
+            "SELECT state FROM outbox_delivery WHERE outbox_id = ?", (entry_id,)
+        )}
+        if PENDING in states:
+            return
+        self._conn.execute(
+            "UPDATE outbox SET state = ?, updated_at = ? WHERE id = ?",
+            (DELIVERED if states == {DELIVERED} else FAILED, now, entry_id),
+        )
+
+    def mark_delivered(self, entry_id: int, channel: str):
+        """
+        :param entry_id: 消息 id
+        :param channel: 投递成功的渠道
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox_delivery SET state = ?, delivered_at = ? WHERE outbox_id = ? AND channel = ?",
+                (DELIVERED, now, entry_id, channel),
+            )
+            self._finish_if_done(entry_id, now)
+
+    def mark_unconfirmed(self, entry_id: int, channel: str, error: str):
+        """
+        记录结果未知的投递，不再重试，也不计为送达
+        :param entry_id: 消息 id
+        :param channel: 渠道
+        :param error: 错误信息
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox_delivery SET state = ?, attempts = attempts + 1, last_error = ? "
+                "WHERE outbox_id = ? AND channel = ?",
+                (UNCONFIRMED, error, entry_id, channel),
+            )
+            self._finish_if_done(entry_id, now)
+
+    def delivery_failed(self, entry_id: int, channel: str, error: str) -> bool:
+        """
+        记录投递失败并安排重试，达到最大尝试次数后不再重试
+        :param entry_id: 消息 id
+        :param channel: 渠道
+        :param error: 错误信息
+        :return: 已放弃重试时返回 True
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            attempts = self._conn.execute(
+                "SELECT attempts FROM outbox_delivery WHERE outbox_id = ? AND channel = ?", (entry_id, channel)
+            ).fetchone()[0] + 1
+            gave_up = attempts >= self.max_attempts
+            self._conn.execute(
+                "UPDATE outbox_delivery SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                "WHERE outbox_id = ? AND channel = ?",
+                (FAILED if gave_up else PENDING, attempts, now + self._retry_delay(attempts), error,
+                 entry_id, channel),
+            )
+            if gave_up:
+                self._finish_if_done(entry_id, now)
+        return gave_up
+
+    def next_due(self) -> float:
+        """
+        :return: 最早的待处理时间（时间戳），没有待处理消息时返回 None
+        """
+        with self._lock:
+            analysis = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE state = ?", (DETECTED,)
+            ).fetchone()[0]
+            delivery = self._conn.execute(
+                "SELECT MIN(d.next_attempt_at) FROM outbox_delivery d JOIN outbox o ON o.id = d.outbox_id "
+                "WHERE o.state = ? AND d.state = ?", (ANALYZED, PENDING)
+            ).fetchone()[0]
+        due = [t for t in (analysis, delivery) if t is not None]
+        return min(due) if due else None
+
+    def purge(self, now: float = None) -> int:
+        """
+        删除超过保留时间的已送达或失败消息及其投递记录
+        :param now: 当前时间戳，为空时使用 time.time()
+        :return: 删除的消息数
+        """
+        if not self.retention:
+            return 0
+        before = (now if now is not None else time.time()) - self.retention
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM outbox_delivery WHERE outbox_id IN "
+                "(SELECT id FROM outbox WHERE state IN (?, ?) AND updated_at < ?)",
+                (DELIVERED, FAILED, before),
+            )
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE state IN (?, ?) AND updated_at < ?", (DELIVERED, FAILED, before)
+            )
+        if cursor.rowcount:
+            self.logger.info(f"已清理{cursor.rowcount}条超过保留时间的发件箱消息")
+        return cursor.rowcount
+
+    def counts(self) -> dict:
+        """
+        :return: 各状态的消息数 {state: count}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DeliveryWorker(object):
+    """
+    发件箱投递线程
+    循环领取到期的待分析消息与待投递渠道，分析与投递失败时交由发件箱安排退避重试；
+    分析与投递的日志使用消息检测时的关联 id
+    """
+    # 没有到期任务时的最长等待时间（秒）
+    poll_interval: float
+    # 清理过期消息的间隔（秒）
+    purge_interval = 3600
+
+    def __init__(self, outbox: Outbox, analyze, deliver, poll_interval: float = 5, should_run=None):
+        """
+        :param outbox: 发件箱
+        :param analyze: 分析函数 analyze(entry)，负责调用 mark_analyzed / analysis_failed
+        :param deliver: 投递函数 deliver(entry, channels) -> {channel: 错误信息}，成功的渠道为 None，
+                        结果未知的渠道为 Unconfirmed
+        :param poll_interval: 没有到期任务时的最长等待时间（秒）
+        :param should_run: 判断当前实例是否负责投递的函数 should_run() -> bool，多实例共用发件箱时
+                           只由一个实例投递，避免重复推送；为空时总是投递
+        """
+        self.outbox = outbox
+        self.analyze = analyze
+        self.deliver = deliver
+        self.poll_interval = poll_interval
+        self.should_run = should_run
+        self.logger = logging.getLogger(__name__)
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        # 上一轮是否由当前实例负责投递
+        self._active = True
+        self._purged_at = None
+
+    def run_once(self) -> int:
+        """
+        处理当前所有到期的分析与投递
+        :return: 处理的任务数
+        """
+        self._active = self.should_run is None or self.should_run()
+        if not self._active:
+            return 0
+        if self._purged_at is None or time.monotonic() - self._purged_at >= self.purge_interval:
+            self._purged_at = time.monotonic()
+            self.outbox.purge()
+        processed = 0
+        while True:
+            entry = self.outbox.claim_analysis()
+            if entry is None:
+                break
+            with log_correlation(entry["cycle_id"]):
+                self.analyze(entry)
+            processed += 1
+            # 每分析完一条立即投递，不必等待其余消息分析完成
+            processed += self._deliver_due()
+        processed += self._deliver_due()
+        return processed
+
+    def _deliver_due(self) -> int:
+        # 同一消息的各渠道一起交给投递函数，由其并发推送
+        processed = 0
+        pending = {}
+        for entry, channel in self.outbox.claim_deliveries():
+            pending.setdefault(entry["id"], (entry, []))[1].append((channel, entry["attempts"]))
+        for entry, channels in pending.values():
+            processed += len(channels)
+            with log_correlation(entry["cycle_id"]):
+                self._deliver_entry(entry, channels)
+        return processed
+
+    def _deliver_entry(self, entry: dict, channels: list):
+        try:
+            results = self.deliver(entry, [channel for channel, _ in channels])
+        except Exception as e:
+            results = {channel: str(e) for channel, _ in channels}
+        for channel, attempts in channels:
+            error = results.get(channel, "未返回推送结果")
+            if error is None:
+                self.outbox.mark_delivered(entry["id"], channel)
+                self.logger.info(f"消息{entry['id']}已投递到{channel}")
+                continue
+            if isinstance(error, Unconfirmed):
+                self.outbox.mark_unconfirmed(entry["id"], channel, error)
+                self.logger.warning(f"消息{entry['id']}投递到{channel}的结果未知，不再重试: {error}")
+                continue
+            gave_up = self.outbox.delivery_failed(entry["id"], channel, error)
+            self.logger.error(
+                f"消息{entry['id']}投递到{channel}失败(第{attempts + 1}次)"
+                f"{'，已放弃重试' if gave_up else '，稍后重试'}: {error}"
+            )
+
+    def wake(self):
+        """
+        有新消息时唤醒投递线程
+        """
+        self._wake_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.error(f"发件箱处理出错: {e}", exc_info=True)
+            timeout = self.poll_interval
+            # 其他实例负责投递时到期任务由其处理，按固定间隔检查是否需要接管
+            next_due = self.outbox.next_due() if self._active else None
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - time.time()))
+            self._wake_event.wait(timeout)
+            self._wake_event.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止投递线程，等待当前任务完成
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread is not None:
+            self._thread.join()
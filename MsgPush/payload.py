@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import json
+
+# 各消息类型内容的字节上限
+TEXT_BYTE_LIMIT = 2048
+MARKDOWN_BYTE_LIMIT = 2048
+MPNEWS_CONTENT_BYTE_LIMIT = 666 * 1024
+# 分段内容可拆分的消息类型 {msgtype: 字节上限}
+SPLITTABLE_LIMITS = {"text": TEXT_BYTE_LIMIT, "markdown": MARKDOWN_BYTE_LIMIT}
+TRIMMED_MARK = "……（内容过长已截断）"
+
+
+def encode_payload(form_data: dict) -> bytes:
+    """
+    将消息体编码为紧凑的 UTF-8 JSON，中文不转义为 \\uXXXX
+    :param form_data: 消息体
+    :return: 请求体
+    """
+    return json.dumps(form_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _cut_utf8(text: str, limit: int) -> str:
+    # 按字节截断且不拆开多字节字符
+    return text.encode("utf-8")[:max(0, limit)].decode("utf-8", errors="ignore")
+
+
+def split_by_lines(content: str, limit: int) -> list:
+    """
+    按行拆分内容，使每段的 UTF-8 字节数不超过上限，单行超出上限时按字符边界再拆分；
+    只含空白的分段被丢弃，企业微信拒绝空消息，而此时前面的分段已经发出
+    :param content: 内容
+    :param limit: 每段字节上限
+    :return: 按顺序排列的非空分段
+    """
+    parts = []
+    current = ""
+    for line in content.splitlines(keepends=True):
+        while len(line.encode("utf-8")) > limit:
+            head = _cut_utf8(line, limit)
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(head)
+            line = line[len(head):]
+        if len((current + line).encode("utf-8")) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    parts.append(current)
+    return [part.rstrip("\n") for part in parts if part.strip()]
+
+
+def trim_html(content: str, limit: int, mark: str = TRIMMED_MARK) -> str:
+    """
+    截断 HTML 内容到字节上限内，不拆开多字节字符与标签，并追加截断标记
+    :param content: HTML 内容
+    :param limit: 字节上限
+    :param mark: 截断标记
+    :return: 截断后的内容，未超出上限时原样返回
+    """
+    if len(content.encode("utf-8")) <= limit:
+        return content
+    trimmed = _cut_utf8(content, limit - len(mark.encode("utf-8")))
+    # 丢弃被截断的半个标签或字符实体
+    if trimmed.rfind("<") > trimmed.rfind(">"):
+        trimmed = trimmed[:trimmed.rfind("<")]
+    if trimmed.rfind("&") > trimmed.rfind(";"):
+        trimmed = trimmed[:trimmed.rfind("&")]
+    return trimmed + mark
+
+
+def split_message(form_data: dict) -> list:
+    """
+    按消息类型的字节上限处理消息体：
+        text / markdown 超出上限时按行拆分为多条消息
+        mpnews 每篇文章内容超出上限时截断
+    :param form_data: 消息体
+    :return: 按发送顺序排列的消息体列表，未超限时只包含原消息体对象
+    """
+    msgtype = form_data.get("msgtype")
+    if msgtype in SPLITTABLE_LIMITS:
+        content = form_data[msgtype]["content"]
+        limit = SPLITTABLE_LIMITS[msgtype]
+        if len(content.encode("utf-8")) <= limit:
+            return [form_data]
+        return [
+            {**form_data, msgtype: {**form_data[msgtype], "content": part}}
+            for part in split_by_lines(content, limit)
+        ]
+    if msgtype == "mpnews":
+        articles = form_data["mpnews"]["articles"]
+        if all(len((article.get("content") or "").encode("utf-8")) <= MPNEWS_CONTENT_BYTE_LIMIT
+               for article in articles):
+            return [form_data]
+        articles = [
+            {**article, "content": trim_html(article.get("content") or "", MPNEWS_CONTENT_BYTE_LIMIT)}
+            for article in articles
+        ]
+        return [{**form_data, "mpnews": {**form_data["mpnews"], "articles": articles}}]
+    return [form_data]
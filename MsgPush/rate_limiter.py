@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    令牌桶限流
+    按固定速率补充令牌，最多累积 capacity 个；令牌不足时阻塞等待而不是报错
+    """
+    # 每秒补充的令牌数，为 0 或空时不限流
+    rate: float
+    # 桶容量，即允许的突发次数
+    capacity: float
+
+    def __init__(self, rate: float, capacity: float):
+        if rate is not None and rate < 0:
+            raise ValueError(f"发送频率限制不能为负数: {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        获取令牌，不足时排队等待
+        :param tokens: 需要的令牌数
+        :return: 等待的时间（秒）
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 先预扣令牌，令牌为负时按欠缺量计算等待时间，保证多个等待者按顺序排队
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(key, rate: float, capacity: float) -> TokenBucket:
+    """
+    获取进程内共享的令牌桶，同一 key 只在首次创建时使用传入的速率
+    :param key: 限流对象，如 (corp_id, agent_id)
+    :param rate: 每秒补充的令牌数
+    :param capacity: 桶容量
+    :return: TokenBucket
+    """
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate, capacity)
+        return _buckets[key]
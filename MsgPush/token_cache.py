@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from Common.metrics import stage_timer
+from Common.transport import get_transport
+
+from .exceptions import WxComError
+
+# 企业微信 access_token 失效相关错误码：40014 不合法的 access_token，42001 access_token 已过期
+INVALID_TOKEN_ERRCODES = {40014, 42001}
+# 企业微信接口地址
+WXCOM_API_BASE = 'https://qyapi.weixin.qq.com'
+
+
+class TokenManager(object):
+    """
+    企业微信 access_token 管理
+    同一 (corp_id, corp_secret) 在进程内共享同一个实例，线程安全；
+    在过期前提前刷新，并将 token 与过期时间持久化到磁盘，重启后可直接复用
+    """
+    # 进程内共享实例 {(corp_id, corp_secret): TokenManager}
+    _instances = {}
+    _instances_lock = threading.Lock()
+    # 提前刷新的时间（秒）
+    refresh_margin = 300
+
+    corp_id: str
+    corp_secret: str
+    # token 缓存文件路径，为空时不持久化
+    cache_path: str
+    # 企业微信接口地址
+    api_base: str
+    token: str
+    expires_at: datetime
+
+    def __init__(self, corp_id: str, corp_secret: str, cache_path: str = None, api_base: str = WXCOM_API_BASE):
+        self.corp_id = corp_id
+        self.corp_secret = corp_secret
+        self.cache_path = cache_path
+        self.api_base = api_base
+        self.token = None
+        self.expires_at = datetime.now()
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self._load()
+
+    @classmethod
+    def get_instance(cls, corp_id: str, corp_secret: str, cache_path: str = None, api_base: str = WXCOM_API_BASE):
+        """
+        获取 (corp_id, corp_secret, api_base) 对应的共享实例
+        :param corp_id: 企业 id
+        :param corp_secret: 应用的凭证密钥
+        :param cache_path: token 缓存文件路径，仅在首次创建实例时生效
+        :param api_base: 企业微信接口地址
+        :return: TokenManager
+        """
+        key = (corp_id, corp_secret, api_base)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(corp_id, corp_secret, cache_path, api_base)
+            return cls._instances[key]
+
+    @property
+    def _cache_key(self) -> str:
+        # 不在磁盘上保存明文密钥
+        return hashlib.sha256(f"{self.corp_id}:{self.corp_secret}".encode()).hexdigest()
+
+    def _read_cache_file(self) -> dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"读取 token 缓存失败: {e}")
+            return {}
+
+    def _load(self):
+        entry = self._read_cache_file().get(self._cache_key)
+        if not entry:
+            return
+        expires_at = datetime.fromtimestamp(entry["expires_at"])
+        if expires_at > datetime.now():
+            self.token = entry["access_token"]
+            self.expires_at = expires_at
+            self.logger.info('已从缓存加载 token')
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        data = self._read_cache_file()
+        data[self._cache_key] = {"access_token": self.token, "expires_at": self.expires_at.timestamp()}
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            self.logger.warning(f"保存 token 缓存失败: {e}")
+
+    def _is_valid(self) -> bool:
+        return self.token is not None and datetime.now() < self.expires_at - timedelta(seconds=self.refresh_margin)
+
+    def get_token(self, force_refresh: bool = False, **kwargs) -> str:
+        """
+        获取 access_token，缓存有效时直接返回
+        :param force_refresh: 是否强制刷新
+        :param kwargs: requests 相关参数，如超时时间
+        :return: access_token
+        """
+        with self._lock:
+            if not force_refresh and self._is_valid():
+                return self.token
+            with stage_timer("token"):
+                self.logger.info('开始获取 token')
+                now = datetime.now()
+                url = f'{self.api_base}/cgi-bin/gettoken?corpid={self.corp_id}&corpsecret={self.corp_secret}'
+                r = get_transport().get(url, **kwargs)
+                data = json.loads(r.text)
+                if data['errcode'] != 0:
+                    self.logger.error('获取 token 失败！请检查！')
+                    raise WxComError(f'获取 token 失败：{data}')
+                self.expires_at = now + timedelta(seconds=data['expires_in'])
+                self.token = data['access_token']
+                self._save()
+                self.logger.info('获取 token 成功')
+                return self.token
+
+    def invalidate(self, token: str):
+        """
+        标记 token 失效，下次获取时强制刷新
+        :param token: 失效的 token，与当前 token 不一致时说明已被其他线程刷新，忽略
+        """
+        with self._lock:
+            if token == self.token:
+                self.token = None
+                self.expires_at = datetime.now()
@@ -3,8 +3,14 @@ import json
 import logging
 
 from .exceptions import SendError, WxComError
-from datetime import datetime, timedelta
-import requests
+from .payload import encode_payload, split_message
+from .rate_limiter import TokenBucket, shared_bucket
+from .token_cache import INVALID_TOKEN_ERRCODES, WXCOM_API_BASE, TokenManager
+from datetime import datetime
+from Common.transport import get_transport
+
+# 单条图文消息最多包含的文章数
+MAX_MPNEWS_ARTICLES = 8
 
 
 class WxComBot(object):
@@ -21,43 +27,86 @@ class WxComBot(object):
     token: str
     # access_token 过期时间，默认为 2 小时过期
     expires_at: datetime
+    # 进程内共享的 access_token 管理
+    token_manager: TokenManager
+    # 每个应用每秒允许发送的消息数
+    rate_limit: float
+    # 每个应用允许的突发消息数
+    rate_burst: int
 
-    def __init__(self, corp_id: str, corp_secret: str):
+    def __init__(self, corp_id: str, corp_secret: str, token_cache_path: str = None, rate_limit: float = 0.5,
+                 rate_burst: int = 10, api_base: str = WXCOM_API_BASE):
+        """
+        :param corp_id: 企业 id
+        :param corp_secret: 应用的凭证密钥
+        :param token_cache_path: access_token 缓存文件路径，为空时仅在进程内缓存
+        :param rate_limit: 每个应用每秒允许发送的消息数，同一应用的所有实例共享限额，超出时排队等待
+        :param rate_burst: 每个应用允许的突发消息数
+        :param api_base: 企业微信接口地址，默认为官方地址
+        """
         self.corp_id = corp_id
         self.corp_secret = corp_secret
-        self.expires_at = datetime.now()
-        logging.basicConfig(format='%(asctime)s [%(name)s] %(levelname)s: %(message)s',
-                            level=logging.INFO, datefmt='%Y-%m-%d %H:%M:%S')
+        self.api_base = api_base
+        self.token_manager = TokenManager.get_instance(corp_id, corp_secret, token_cache_path, api_base)
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
         self.logger = logging.getLogger(__name__)
 
-    def get_token(self, **kwargs):
-        self.logger.info('开始获取 token')
-        now = datetime.now()
-        url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corp_id}&corpsecret={self.corp_secret}'
-        r = requests.get(url, **kwargs)
-        data = json.loads(r.text)
-        if data['errcode'] != 0:
-            self.logger.error('获取 token 失败！请检查！')
-        self.expires_at = now + timedelta(seconds=data['expires_in'])
-        self.token = data['access_token']
-        self.logger.info('获取 token 成功')
-        return self.token
+    @property
+    def token(self) -> str:
+        return self.token_manager.token
+
+    @property
+    def expires_at(self) -> datetime:
+        return self.token_manager.expires_at
+
+    def get_token(self, force_refresh: bool = False, **kwargs):
+        return self.token_manager.get_token(force_refresh=force_refresh, **kwargs)
+
+    def rate_limiter(self, agent_id) -> TokenBucket:
+        """
+        :param agent_id: 应用 id
+        :return: 该应用在进程内共享的令牌桶
+        """
+        return shared_bucket((self.corp_id, str(agent_id)), self.rate_limit, self.rate_burst)
 
     def _send_msg(self, form_data: dict, **kwargs):
         if not form_data.get('touser') and not form_data.get('toparty') and not form_data.get('totag'):
             raise ValueError('[to_user,to_party,to_tag] 不能同时为空')
-        if len(form_data.get('content', '').encode()) > 2048:
-            self.logger.warning(f'消息长度超出 2048 字节 ，消息将被企业微信截断')
-        now = datetime.now()
-        if now >= self.expires_at:
-            self.get_token()
-
-        url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={self.token}&debug=1'
-        try:
-            r = requests.post(url, data=json.dumps(form_data), **kwargs)
-        except Exception as e:
-            raise SendError(f'发送 post 请求失败，详情如下：\n{e}')
-        response = json.loads(r.content.decode('utf-8'))
+
+        # 按消息类型的字节上限拆分或截断，避免被企业微信静默截断
+        messages = split_message(form_data)
+        if len(messages) > 1:
+            self.logger.info(f'消息超出 {form_data["msgtype"]} 长度上限，按行拆分为 {len(messages)} 条发送')
+        elif messages[0] is not form_data:
+            self.logger.warning('图文消息内容超出长度上限，已截断')
+        response = None
+        for message in messages:
+            response = self._post_msg(message, **kwargs)
+        return response
+
+    def _post_msg(self, form_data: dict, **kwargs):
+        # 请求体只编码一次，token 失效重试时复用
+        body = encode_payload(form_data)
+        headers = {'Content-Type': 'application/json; charset=utf-8', **kwargs.pop('headers', {})}
+        rate_limiter = self.rate_limiter(form_data.get('agentid'))
+        # token 被企业微信判定失效时强制刷新后重试一次
+        for attempt in range(2):
+            waited = rate_limiter.acquire()
+            if waited > 0:
+                self.logger.info(f'已达到应用发送频率上限，排队等待 {waited:.1f} 秒')
+            token = self.get_token()
+            url = f'{self.api_base}/cgi-bin/message/send?access_token={token}&debug=1'
+            try:
+                r = get_transport().post(url, data=body, headers=headers, **kwargs)
+            except Exception as e:
+                raise SendError(f'发送 post 请求失败，详情如下：\n{e}')
+            response = json.loads(r.content.decode('utf-8'))
+            if response.get('errcode') in INVALID_TOKEN_ERRCODES and attempt == 0:
+                self.logger.warning(f'token 已失效，重新获取：{response.get("errmsg")}')
+                self.token_manager.invalidate(token)
+                continue
+            break
         if response.get('errcode') != 0:
             raise WxComError(
                 f'{response}\n请查阅企业微信错误码 [ https://work.weixin.qq.com/api/doc/90000/90139/90313 ]')
@@ -70,7 +119,7 @@ class WxComBot(object):
         """
         发送文本类型消息
         :param agent_id: 企业应用的id，整型。企业内部开发，可在应用的设置页面查看
-        :param content: 消息内容，最长不超过2048个字节，超过将截断（支持id转译）
+        :param content: 消息内容，最长不超过2048个字节，超过时按行拆分为多条消息依次发送（支持id转译）
                         content 参数支持换行（\n）、以及 a 标签（打开自定义的网页）
         :param to_user: 指定接收消息的成员，成员ID列表（多个接收者用 | 分隔，最多支持1000个）。
                         特殊情况：指定为 @all ，则向该企业应用的全部成员发送
@@ -107,7 +156,7 @@ class WxComBot(object):
         """
         发送 markdown 类型消息
         :param agent_id: 企业应用的id，整型。企业内部开发，可在应用的设置页面查看
-        :param content: 消息内容，最长不超过2048个字节，超过将截断（支持id转译）
+        :param content: 消息内容，最长不超过2048个字节，超过时按行拆分为多条消息依次发送（支持id转译）
                         content 参数支持换行（\n）、以及 a 标签（打开自定义的网页）
         :param to_user: 指定接收消息的成员，成员ID列表（多个接收者用 | 分隔，最多支持1000个）。
                         特殊情况：指定为 @all ，则向该企业应用的全部成员发送
@@ -186,7 +235,7 @@ class WxComBot(object):
             - thumb_media_id: 图文消息缩略图的media_id, 可以通过素材管理接口获得
             - author: 图文消息的作者，不超过64个字节（可选）
             - content_source_url: 图文消息点击“阅读原文”之后的页面链接（可选）
-            - content: 图文消息的内容，支持html标签，不超过666 K个字节（支持id转译）
+            - content: 图文消息的内容，支持html标签，不超过666 K个字节，超过时截断（支持id转译）
             - digest: 图文消息的描述，不超过512个字节，超过会自动截断（支持id转译）（可选）
         :param ouser: 成员ID列表（消息接收者，多个接收者用‘|’分隔，最多支持1000个）。特殊情况：指定为@all，则向关注该企业应用的全部成员发送
         :param toparty: 部门ID列表，多个接收者用‘|’分隔，最多支持100个。当touser为@all时忽略本参数
@@ -213,3 +262,16 @@ class WxComBot(object):
             "duplicate_check_interval": duplicate_check_interval
         }
         return self._send_msg(form_data=form_data, **kwargs)
+
+    def send_mpnews_batched(self, agentid: int, articles: list, **kwargs) -> list:
+        """
+        发送图文消息，文章超过 8 篇时按每条 8 篇拆分为多条消息
+        :param agentid: 企业应用的id
+        :param articles: 图文消息列表，格式同 send_mpnews_msg
+        :param kwargs: send_mpnews_msg 的其他参数
+        :return: 每条消息的响应
+        """
+        return [
+            self.send_mpnews_msg(agentid=agentid, articles=articles[i:i + MAX_MPNEWS_ARTICLES], **kwargs)
+            for i in range(0, len(articles), MAX_MPNEWS_ARTICLES)
+        ]
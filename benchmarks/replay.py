@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+加速回放测试
+按录制的新闻历史（news.json 或 SQLite 新闻库）中原有的发布间隔，以时间压缩倍率在本地替身 RSS 中依次发布新闻，
+在新进程中运行真实的检测、分析与推送流程，统计每条新闻从发布到检测、分析完成与推送成功的延迟，
+用于在几分钟内比较不同轮询、缓存与投递策略在真实发布节奏下的表现
+
+时间换算：
+    - 新闻按 原发布间隔 / scale 的墙钟间隔出现，RSS 中的 pubDate 改写为实际出现时间
+    - 轮询间隔（rss.check_interval 与自适应轮询的各项间隔）同样除以 scale，检测延迟另按 scale 换算为虚拟时间
+    - 模型与推送的耗时不压缩，分析与投递延迟以墙钟时间报告；自适应轮询的每周时段统计在压缩后没有参考意义
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.replay --source news.json --scale 600 --output replay_results.json
+    python -m benchmarks.replay --source news.db --mode once --adaptive
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from benchmarks.run_benchmarks import REPO_ROOT, git_revision, write_config
+from benchmarks.stub_server import StubServer
+from Monitor.news_store import SqliteNewsStore, load_json_news, news_key
+from Monitor.poll_policy import AdaptivePollPolicy, pub_timestamp
+
+SCHEDULER_COMMAND = "import main; main.bootstrap(); main.run_scheduler()"
+ONCE_COMMAND = "import main; main.bootstrap(); main.main()"
+
+
+def load_history(source: str) -> list:
+    """
+    读取录制的新闻历史
+    :param source: news.json 或 SQLite 新闻库路径
+    :return: 按发布时间从旧到新排列的新闻，无法解析发布时间的新闻被忽略
+    """
+    if source.endswith(".json"):
+        news_items = load_json_news(source)
+    else:
+        store = SqliteNewsStore(source)
+        try:
+            news_items = list(store.items())
+        finally:
+            store.close()
+    news_items = [news for news in news_items if pub_timestamp(news.get("pubDate")) is not None]
+    news_items.sort(key=lambda news: pub_timestamp(news["pubDate"]))
+    return news_items
+
+
+class ReplayFeed(object):
+    """
+    回放中的订阅源，作为替身服务的 feed_source，只输出已到出现时间的新闻
+    """
+
+    def __init__(self, news_items: list, appear_times: list, feed_count: int = 10):
+        """
+        :param news_items: 按发布时间从旧到新排列的新闻
+        :param appear_times: 每条新闻的出现时间（墙钟时间戳）
+        :param feed_count: RSS 中保留的最新新闻条数
+        """
+        self.news_items = []
+        for news, appear_at in zip(news_items, appear_times):
+            news = dict(news)
+            news["pubDate"] = format_datetime(datetime.fromtimestamp(appear_at, tz=timezone.utc))
+            self.news_items.append(news)
+        self.appear_times = appear_times
+        self.feed_count = feed_count
+
+    def __call__(self) -> list:
+        now = time.time()
+        visible = [news for news, appear_at in zip(self.news_items, self.appear_times) if appear_at <= now]
+        return list(reversed(visible[-self.feed_count:]))
+
+
+def schedule(news_items: list, scale: float, max_gap: float, first_at: float, first_index: int) -> list:
+    """
+    计算每条新闻的出现时间
+    :param news_items: 按发布时间从旧到新排列的新闻
+    :param scale: 时间压缩倍率
+    :param max_gap: 相邻新闻的最长虚拟间隔（秒），超出时截断以跳过长时间的空闲，为 0 时不截断
+    :param first_at: 第一条回放新闻的出现时间（墙钟时间戳）
+    :param first_index: 第一条回放新闻的序号，之前的新闻作为历史，出现时间早于 first_at
+    :return: 出现时间列表
+    """
+    offsets = [0.0]
+    for previous, news in zip(news_items, news_items[1:]):
+        gap = pub_timestamp(news["pubDate"]) - pub_timestamp(previous["pubDate"])
+        if max_gap:
+            gap = min(gap, max_gap)
+        offsets.append(offsets[-1] + gap)
+    base = offsets[first_index]
+    return [first_at + (offset - base) / scale for offset in offsets]
+
+
+def scaled_config(path: str, stub: StubServer, scale: float, check_interval: float, adaptive: bool):
+    """
+    修改 write_config 生成的配置：订阅地址指向回放订阅源，轮询间隔按倍率压缩
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config["rss"]["url"] = stub.feed_url()
+    config["rss"]["check_interval"] = check_interval / scale
+    if adaptive:
+        policy = AdaptivePollPolicy()
+        config["rss"]["adaptive"] = {
+            "enabled": True,
+            "min_interval": policy.min_interval / scale,
+            "max_interval": policy.max_interval / scale,
+            "hot_interval": policy.hot_interval / scale,
+            "recent_window": policy.recent_window / scale,
+            "hot_ratio": policy.hot_ratio,
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    return config
+
+
+def outbox_timings(db_path: str) -> dict:
+    """
+    :return: {新闻标识: (检测时间, 分析完成时间, 首个渠道推送成功时间)}，发件箱尚未创建时返回空字典
+    """
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        rows = conn.execute(
+            "SELECT o.news_items, o.created_at, o.analyzed_at, MIN(d.delivered_at) "
+            "FROM outbox o LEFT JOIN outbox_delivery d ON d.outbox_id = o.id GROUP BY o.id"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+    timings = {}
+    for news_items, created_at, analyzed_at, delivered_at in rows:
+        for news in json.loads(news_items):
+            timings.setdefault(news_key(news), (created_at, analyzed_at, delivered_at))
+    return timings
+
+
+def all_delivered(feed: ReplayFeed, first_index: int, db_path: str) -> bool:
+    timings = outbox_timings(db_path)
+    for news in feed.news_items[first_index:]:
+        timing = timings.get(news_key(news))
+        if timing is None or timing[2] is None:
+            return False
+    return True
+
+
+def summarize(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "median": statistics.median(samples),
+        "p90": statistics.quantiles(samples, n=10, method="inclusive")[-1] if len(samples) > 1 else samples[0],
+        "max": max(samples),
+    }
+
+
+def report(feed: ReplayFeed, first_index: int, db_path: str, scale: float) -> dict:
+    """
+    汇总每条回放新闻的各阶段延迟（秒）
+    """
+    timings = outbox_timings(db_path)
+    items = []
+    stages = {"detect": [], "detect_virtual": [], "analyze": [], "deliver": [], "total": []}
+    for news, appear_at in zip(feed.news_items[first_index:], feed.appear_times[first_index:]):
+        created_at, analyzed_at, delivered_at = timings.get(news_key(news), (None, None, None))
+        item = {"title": news.get("title"), "link": news.get("link")}
+        if created_at is not None:
+            item["detect"] = created_at - appear_at
+            item["detect_virtual"] = item["detect"] * scale
+        if analyzed_at is not None and created_at is not None:
+            item["analyze"] = analyzed_at - created_at
+        if delivered_at is not None:
+            if analyzed_at is not None:
+                item["deliver"] = delivered_at - analyzed_at
+            item["total"] = delivered_at - appear_at
+        for stage, samples in stages.items():
+            if stage in item:
+                samples.append(item[stage])
+        items.append(item)
+    return {
+        "items": items,
+        "stages": {stage: summarize(samples) for stage, samples in stages.items()},
+        "missed": sum(1 for item in items if "total" not in item),
+    }
+
+
+def run_scheduler_mode(env: dict, feed: ReplayFeed, first_index: int, deadline: float):
+    process = subprocess.Popen([sys.executable, "-c", SCHEDULER_COMMAND], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.time() < deadline and process.poll() is None:
+            if time.time() >= feed.appear_times[-1] and all_delivered(feed, first_index, "outbox.db"):
+                break
+            time.sleep(0.2)
+    finally:
+        if process.poll() is None:
+            # 与 Ctrl+C 相同，调度器停止投递线程并输出轮询统计后退出
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def run_once_mode(env: dict, feed: ReplayFeed, first_index: int, deadline: float, interval: float):
+    # 模拟定时任务：每个间隔启动一个新进程执行一轮 main.main()
+    while time.time() < deadline:
+        started = time.time()
+        subprocess.run([sys.executable, "-c", ONCE_COMMAND], env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if started >= feed.appear_times[-1] and all_delivered(feed, first_index, "outbox.db"):
+            break
+        time.sleep(max(0.0, interval - (time.time() - started)))
+
+
+def print_report(result: dict):
+    for item in result["items"]:
+        stages = "  ".join(
+            f"{stage} {item[stage]:8.2f}s" if stage in item else f"{stage} {'-':>8} "
+            for stage in ("detect", "analyze", "deliver", "total")
+        )
+        print(f"{(item['title'] or '')[:40]:<40} {stages}")
+    print()
+    for stage, summary in result["stages"].items():
+        if not summary["count"]:
+            continue
+        print(f"{stage:<16} median {summary['median']:10.2f}s  p90 {summary['p90']:10.2f}s  "
+              f"max {summary['max']:10.2f}s")
+    print(f"未在时限内推送: {result['missed']}条")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="cs-monitor 加速回放测试")
+    parser.add_argument("--source", default="news.json", help="录制的新闻历史，news.json 或 SQLite 新闻库")
+    parser.add_argument("--scale", type=float, default=600, help="时间压缩倍率，600 表示墙钟 1 秒对应 10 分钟")
+    parser.add_argument("--max-gap", type=float, default=3600, help="相邻新闻的最长虚拟间隔（秒），0 表示不截断")
+    parser.add_argument("--history", type=int, default=1, help="回放前已保存的历史新闻条数")
+    parser.add_argument("--limit", type=int, default=0, help="最多回放的新闻条数，0 表示全部")
+    parser.add_argument("--feed-count", type=int, default=10, help="RSS 中保留的最新新闻条数")
+    parser.add_argument("--mode", choices=("scheduler", "once"), default="scheduler",
+                        help="scheduler 运行定时任务模式；once 按轮询间隔重复启动单次运行")
+    parser.add_argument("--check-interval", type=float, default=300, help="虚拟时间下的轮询间隔（秒）")
+    parser.add_argument("--adaptive", action="store_true", help="启用自适应轮询")
+    parser.add_argument("--warmup", type=float, default=3, help="第一条回放新闻出现前的等待时间（秒）")
+    parser.add_argument("--drain", type=float, default=60, help="最后一条新闻出现后等待推送完成的时间（秒）")
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="模型首 token 延迟（秒）")
+    parser.add_argument("--llm-tokens", type=int, default=200, help="模型回答 token 数")
+    parser.add_argument("--llm-token-delay", type=float, default=0.001, help="模型每个 token 的间隔（秒）")
+    parser.add_argument("--output", help="结果输出文件")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（配置、数据库与日志）")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    news_items = load_history(os.path.abspath(args.source))
+    first_index = min(max(args.history, 0), len(news_items))
+    if args.limit:
+        news_items = news_items[:first_index + args.limit]
+    if first_index >= len(news_items):
+        sys.exit(f"{args.source} 中没有可回放的新闻")
+    output = os.path.abspath(args.output) if args.output else None
+
+    stub = StubServer(llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay, llm_tokens=args.llm_tokens)
+    stub.start()
+    workdir = tempfile.mkdtemp(prefix="cs-monitor-replay-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_config(stub, 0)
+        config = scaled_config("config.json", stub, args.scale, args.check_interval, args.adaptive)
+        appear_times = schedule(news_items, args.scale, args.max_gap, time.time() + args.warmup, first_index)
+        feed = ReplayFeed(news_items, appear_times, args.feed_count)
+
+        # 回放前的新闻写入新闻库，作为已推送过的历史
+        store = SqliteNewsStore(config["data"]["db_path"])
+        store.add(config["rss"]["url"], feed.news_items[:first_index])
+        store.close()
+        stub.feed_source = feed
+        print(f"回放{len(news_items) - first_index}条新闻，预计耗时"
+              f"{appear_times[-1] - time.time():.1f}秒，工作目录: {workdir}")
+
+        env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+        deadline = appear_times[-1] + args.drain
+        if args.mode == "scheduler":
+            run_scheduler_mode(env, feed, first_index, deadline)
+        else:
+            run_once_mode(env, feed, first_index, deadline, config["rss"]["check_interval"])
+        result = report(feed, first_index, "outbox.db", args.scale)
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(result)
+    if output:
+        result.update({
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "keep")},
+        })
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    run()
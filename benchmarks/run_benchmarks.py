@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+离线基准测试
+在临时目录中启动本地替身服务并生成指向它的 config.json，测量 RSS 解析、新闻比对、
+news.json 读写与完整一轮检测到推送的耗时，结果以 JSON 保存，可与其他提交的结果对比
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.run_benchmarks --output bench_results.json
+    python -m benchmarks.run_benchmarks --quick --compare bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stub_server import StubServer, generate_rss, news_item  # noqa: E402
+
+
+def measure(name: str, fn, runs: int, setup=None, **params) -> dict:
+    """
+    多次执行并统计耗时
+    :param name: 基准名称
+    :param fn: 被测函数，接收 setup 的返回值
+    :param runs: 执行次数
+    :param setup: 每次执行前调用的准备函数，耗时不计入结果
+    :param params: 记录到结果中的参数
+    """
+    timings = []
+    for _ in range(runs):
+        state = setup() if setup is not None else None
+        started = time.perf_counter()
+        fn(state)
+        timings.append(time.perf_counter() - started)
+    result = {
+        "name": name,
+        "params": params,
+        "runs": runs,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+    }
+    print(f"{name:<32} {json.dumps(params, ensure_ascii=False):<40} "
+          f"median {result['median'] * 1000:10.2f} ms  min {result['min'] * 1000:10.2f} ms")
+    return result
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_config(stub: StubServer, html_size: int):
+    """
+    在当前目录生成指向替身服务的 config.json
+    """
+    config = {
+        "proxy": {"enabled": False, "http": "", "https": "", "hosts": []},
+        "http": {"connect_timeout": 5, "read_timeout": 30, "retries": 0, "backoff": 0.1, "pool_size": 10},
+        "openai": {
+            "api_key": "stub",
+            "base_url": f"{stub.base_url}/v1",
+            "model": "stub-reasoner",
+            "cache_file": "analysis_cache.json",
+            "analysis_mode": "batch",
+            "latency_budget": 60,
+            "fallback_model": None,
+        },
+        "wx_push": {
+            "corp_id": "bench",
+            "corp_secret": "bench",
+            "agent_id": "1000002",
+            "to_party": "2",
+            "api_base": stub.base_url,
+            "token_cache_file": "wx_token.json",
+            "media_cache_file": "wx_media.json",
+            "rate_limit": 1000,
+            "rate_burst": 1000,
+        },
+        "rss": {
+            "url": stub.feed_url(count=10, html_size=html_size),
+            "check_interval": 300,
+            "state_file": "rss_state.json",
+            "feeds": [],
+            "adaptive": {"enabled": False},
+        },
+        "data": {"backend": "sqlite", "db_path": "news.db", "json_file_path": "news.json"},
+        "outbox": {"db_path": "outbox.db", "backoff": 1},
+        "metrics": {"enabled": False},
+        "spug": {"enabled": False, "url": ""},
+    }
+    with open("config.json", "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    shutil.copy(os.path.join(REPO_ROOT, "media.jpg"), "media.jpg")
+
+
+def bench_parse(main, sizes: list, html_size: int, runs: int) -> list:
+    results = []
+    for size in sizes:
+        xml_content = generate_rss(size, size, html_size)
+        results.append(measure(
+            "parse_rss_feed", lambda _: main.parse_rss_feed(xml_content), runs,
+            items=size, html_size=html_size, bytes=len(xml_content),
+        ))
+        # 只有最新 5 条是新新闻时，遇到已有新闻即停止解析
+        known_keys = {news_item(i, 0)["link"] for i in range(1, size - 4)}
+        results.append(measure(
+            "parse_rss_feed_early_stop", lambda _: main.parse_rss_feed(xml_content, known_keys=known_keys), runs,
+            items=size, html_size=html_size, new=min(5, size),
+        ))
+    return results
+
+
+def bench_diff(main, sizes: list, runs: int) -> list:
+    results = []
+    for size in sizes:
+        existing = [news_item(i, 0) for i in range(1, size + 1)]
+        latest = [news_item(i, 0) for i in range(size + 5, max(0, size - 5), -1)]
+        results.append(measure(
+            "check_for_new_news_list", lambda _: main.check_for_new_news(existing, latest), runs, history=size,
+        ))
+        existing_fingerprints = {news["link"]: main.content_fingerprint(news) for news in existing}
+        results.append(measure(
+            "check_for_new_news_map", lambda _: main.check_for_new_news(existing_fingerprints, latest), runs,
+            history=size,
+        ))
+    return results
+
+
+def bench_json_io(main, sizes: list, html_size: int, runs: int) -> list:
+    results = []
+    for size in sizes:
+        history = [news_item(i, html_size) for i in range(1, size + 1)]
+        path = f"history_{size}.json"
+        results.append(measure(
+            "save_news_to_file", lambda _: main.save_news_to_file(path, history), runs,
+            history=size, html_size=html_size,
+        ))
+        results.append(measure(
+            "load_existing_news", lambda _: main.load_existing_news(path), runs,
+            history=size, html_size=html_size,
+        ))
+        os.remove(path)
+    return results
+
+
+def bench_cycle(main, stub: StubServer, history: int, new_items: int, runs: int) -> list:
+    rss_url = main.CONFIG["rss"]["url"]
+    main.news_store.add(rss_url, [news_item(i, 0) for i in range(1, history + 1)])
+    stub.feed_latest = history
+    main.main()
+
+    def publish():
+        stub.feed_latest += new_items
+        return len(stub.sent_messages)
+
+    def run_cycle(sent_before):
+        main.main()
+        if len(stub.sent_messages) <= sent_before:
+            raise RuntimeError("本轮没有推送消息，请检查日志")
+
+    results = [measure(
+        "cycle_new_items", run_cycle, runs, setup=publish,
+        history=history, new_items=new_items, llm_ttft=stub.llm_ttft, llm_tokens=stub.llm_tokens,
+    )]
+    # 内容未变化时的一轮（条件请求短路）
+    results.append(measure("cycle_unchanged", lambda _: main.main(), runs, history=history))
+    return results
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_medians = {
+        (item["name"], json.dumps(item["params"], sort_keys=True)): item["median"] for item in baseline["results"]
+    }
+    print(f"\n与 {baseline.get('revision')} 对比（median，>1 表示变慢）：")
+    for item in results:
+        key = (item["name"], json.dumps(item["params"], sort_keys=True))
+        if key in baseline_medians and baseline_medians[key] > 0:
+            ratio = item["median"] / baseline_medians[key]
+            print(f"{item['name']:<32} {json.dumps(item['params'], ensure_ascii=False):<40} x{ratio:.2f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="cs-monitor 离线基准测试")
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="RSS 条数/历史条数，逗号分隔")
+    parser.add_argument("--html-size", type=int, default=512, help="每条新闻描述的大致字节数")
+    parser.add_argument("--runs", type=int, default=5, help="每项执行次数")
+    parser.add_argument("--cycle-history", type=int, default=1000, help="端到端测试中已有的新闻条数")
+    parser.add_argument("--cycle-new-items", type=int, default=3, help="端到端测试中每轮的新新闻条数")
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="模型首 token 延迟（秒）")
+    parser.add_argument("--llm-tokens", type=int, default=200, help="模型回答 token 数")
+    parser.add_argument("--llm-token-delay", type=float, default=0.001, help="模型每个 token 的间隔（秒）")
+    parser.add_argument("--quick", action="store_true", help="只运行小规模数据，用于快速检查")
+    parser.add_argument("--output", default="bench_results.json", help="结果输出文件")
+    parser.add_argument("--compare", help="用于对比的历史结果文件")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if args.quick:
+        sizes = [size for size in sizes if size <= 1000]
+        args.runs = min(args.runs, 3)
+    output = os.path.abspath(args.output)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    stub = StubServer(llm_ttft=args.llm_ttft, llm_token_delay=args.llm_token_delay, llm_tokens=args.llm_tokens)
+    stub.start()
+    workdir = tempfile.mkdtemp(prefix="cs-monitor-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_config(stub, args.html_size)
+        import main
+        main.init()
+
+        results = []
+        results += bench_parse(main, sizes, args.html_size, args.runs)
+        results += bench_diff(main, sizes, args.runs)
+        results += bench_json_io(main, sizes, args.html_size, args.runs)
+        results += bench_cycle(main, stub, args.cycle_history, args.cycle_new_items, args.runs)
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"\n结果已保存: {output}")
+    if compare_path:
+        compare(results, compare_path)
+
+
+if __name__ == "__main__":
+    run()
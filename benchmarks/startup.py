@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+单次运行模式启动耗时测试
+每次在新的 Python 进程中以 -X importtime 执行一轮 main.main()，统计导入 main 的耗时、
+整轮墙钟时间，以及没有新新闻时是否导入了 openai / requests_toolbelt
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import REPO_ROOT, write_config
+from benchmarks.stub_server import StubServer
+
+# 没有新新闻时不应导入的模块
+DEFERRED_MODULES = ("openai", "requests_toolbelt")
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def run_once() -> dict:
+    """
+    在新进程中执行一轮 main.main()
+    :return: 墙钟时间、导入 main 的累计耗时与已导入的延迟模块
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main; main.main()"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    import_main = 0
+    imported = set()
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match is None:
+            continue
+        module = match.group(4)
+        imported.add(module.split(".")[0])
+        if module == "main":
+            import_main = int(match.group(2)) / 1e6
+    return {
+        "wall": elapsed,
+        "import_main": import_main,
+        "deferred_imported": sorted(imported.intersection(DEFERRED_MODULES)),
+    }
+
+
+def summarize(name: str, samples: list) -> dict:
+    result = {
+        "name": name,
+        "runs": len(samples),
+        "wall_median": statistics.median(sample["wall"] for sample in samples),
+        "import_main_median": statistics.median(sample["import_main"] for sample in samples),
+        "deferred_imported": sorted({module for sample in samples for module in sample["deferred_imported"]}),
+    }
+    print(f"{name:<16} 墙钟 {result['wall_median'] * 1000:8.1f} ms  "
+          f"导入main {result['import_main_median'] * 1000:8.1f} ms  "
+          f"已导入: {', '.join(result['deferred_imported']) or '无'}")
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="cs-monitor 单次运行启动耗时测试")
+    parser.add_argument("--runs", type=int, default=10, help="每种情况执行次数")
+    parser.add_argument("--output", help="结果输出文件")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    stub = StubServer(llm_ttft=0, llm_token_delay=0)
+    stub.start()
+    workdir = tempfile.mkdtemp(prefix="cs-monitor-startup-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_config(stub, 512)
+        # 首轮导入全部新闻，之后的运行均没有新新闻
+        run_once()
+        results = [summarize("no_news_304", [run_once() for _ in range(args.runs)])]
+
+        # 删除条件请求状态，模拟内容变化但没有新新闻
+        def changed():
+            os.remove("rss_state.json")
+            return run_once()
+
+        results.append(summarize("no_news_200", [changed() for _ in range(args.runs)]))
+
+        def published():
+            stub.feed_latest += 1
+            return run_once()
+
+        results.append(summarize("new_news", [published() for _ in range(args.runs)]))
+    finally:
+        os.chdir(cwd)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    run()
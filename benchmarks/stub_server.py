@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+本地替身服务
+模拟 Steam RSS、企业微信（gettoken / media/upload / message/send）与 OpenAI 兼容的流式对话接口，
+用于离线基准测试，不访问任何外部服务
+"""
+import hashlib
+import json
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+# 第 1 条新闻的发布时间，之后每条间隔 1 小时
+BASE_TIMESTAMP = 1700000000
+
+
+def news_pub_date(index: int) -> str:
+    return format_datetime(datetime.fromtimestamp(BASE_TIMESTAMP + index * 3600, tz=timezone.utc))
+
+
+def news_description(index: int, html_size: int) -> str:
+    """
+    生成与 Steam 补丁说明结构相近的 HTML 描述
+    :param index: 新闻序号
+    :param html_size: 描述的大致字节数
+    """
+    parts = [f"[地图]<br><ul class=\"bb_ul\"><li>第{index}次更新"]
+    size = len(parts[0].encode("utf-8"))
+    line = 0
+    while size < html_size:
+        item = f"<ul class=\"bb_ul\"><li>修复了第{line}个与&quot;炼狱小镇&quot;相关的问题。<br></li></ul>"
+        parts.append(item)
+        size += len(item.encode("utf-8"))
+        line += 1
+    parts.append("</li></ul>")
+    return "".join(parts)
+
+
+def news_item(index: int, html_size: int = 512) -> dict:
+    """
+    :param index: 新闻序号，从 1 开始，序号越大越新
+    :param html_size: 描述的大致字节数
+    :return: 与 RSS 解析结果格式一致的新闻字典
+    """
+    return {
+        "title": f"《反恐精英》更新 #{index}",
+        "link": f"https://store.steampowered.com/news/app/730/view/{index}",
+        "pubDate": news_pub_date(index),
+        "description": news_description(index, html_size),
+    }
+
+
+def render_rss(news_items: list) -> bytes:
+    """
+    :param news_items: 新闻列表，按发布时间倒序
+    :return: RSS 文档
+    """
+    items = []
+    for news in news_items:
+        items.append(
+            "<item>"
+            f"<title>{escape(news.get('title') or '')}</title>"
+            f"<link>{escape(news.get('link') or '')}</link>"
+            f"<pubDate>{news['pubDate']}</pubDate>"
+            f"<description>{escape(news.get('description') or '')}</description>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        "<title>Counter-Strike 2</title>" + "".join(items) + "</channel></rss>"
+    ).encode("utf-8")
+
+
+def generate_rss(latest: int, count: int, html_size: int = 512, edits: dict = None) -> bytes:
+    """
+    生成按发布时间倒序排列的 RSS
+    :param latest: 最新一条新闻的序号
+    :param count: 新闻条数
+    :param html_size: 每条描述的大致字节数
+    :param edits: {新闻序号: 追加到描述末尾的 HTML}，模拟编辑过的新闻
+    """
+    news_items = []
+    for index in range(latest, max(0, latest - count), -1):
+        news = news_item(index, html_size)
+        if edits and index in edits:
+            news["description"] += edits[index]
+        news_items.append(news)
+    return render_rss(news_items)
+
+
+class StubServer(object):
+    """
+    本地替身服务
+    路由：
+        GET  /feeds?latest=N&count=M&html_size=S   RSS，支持 ETag 条件请求，未指定 latest 时使用 feed_latest；
+                                                   设置了 feed_source 时改为输出其返回的新闻
+        GET  /cgi-bin/gettoken                     企业微信 access_token
+        POST /cgi-bin/media/upload                 企业微信临时素材上传
+        POST /cgi-bin/message/send                 企业微信消息发送
+        POST .../chat/completions                  OpenAI 兼容的流式对话
+    """
+    # 模型首个 token 的延迟（秒）
+    llm_ttft: float
+    # 模型每个 token 的间隔（秒）
+    llm_token_delay: float
+    # 模型推理 token 数
+    llm_reasoning_tokens: int
+    # 模型回答 token 数
+    llm_tokens: int
+
+    def __init__(self, llm_ttft: float = 0.2, llm_token_delay: float = 0.001, llm_reasoning_tokens: int = 50,
+                 llm_tokens: int = 200):
+        self.llm_ttft = llm_ttft
+        self.llm_token_delay = llm_token_delay
+        self.llm_reasoning_tokens = llm_reasoning_tokens
+        self.llm_tokens = llm_tokens
+        # /feeds 未指定 latest 时的最新新闻序号，调大即模拟发布了新新闻
+        self.feed_latest = 10
+        # {新闻序号: 追加的 HTML}，修改即模拟编辑了已发布的新闻
+        self.feed_edits = {}
+        # 返回当前新闻列表（按发布时间倒序）的函数，设置后 /feeds 输出其结果，用于回放录制的新闻
+        self.feed_source = None
+        # 各路由的请求数
+        self.requests = {}
+        # 收到的企业微信消息
+        self.sent_messages = []
+        self._rss_cache = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def feed_url(self, count: int = 10, html_size: int = 512) -> str:
+        """
+        :return: 最新新闻随 feed_latest 变化的订阅地址
+        """
+        return f"{self.base_url}/feeds?count={count}&html_size={html_size}"
+
+    def rss(self, latest: int, count: int, html_size: int) -> bytes:
+        if self.feed_source is not None:
+            return render_rss(self.feed_source())
+        with self._lock:
+            key = (latest, count, html_size, tuple(sorted(self.feed_edits.items())))
+            if key not in self._rss_cache:
+                self._rss_cache[key] = generate_rss(latest, count, html_size, self.feed_edits)
+            return self._rss_cache[key]
+
+    def _count(self, route: str):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        在后台线程启动服务
+        :return: 服务地址
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data: dict):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+                stub._count(parts.path)
+                if parts.path == "/feeds":
+                    body = stub.rss(int(query.get("latest", stub.feed_latest)), int(query.get("count", 10)),
+                                    int(query.get("html_size", 512)))
+                    etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif parts.path == "/cgi-bin/gettoken":
+                    self._send_json({"errcode": 0, "errmsg": "ok", "access_token": "stub-token", "expires_in": 7200})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                parts = urlsplit(self.path)
+                stub._count(parts.path)
+                body = self._read_body()
+                if parts.path == "/cgi-bin/media/upload":
+                    self._send_json({"errcode": 0, "errmsg": "ok", "type": "image", "media_id": "stub-media"})
+                elif parts.path == "/cgi-bin/message/send":
+                    with stub._lock:
+                        stub.sent_messages.append(json.loads(body.decode("utf-8")))
+                    self._send_json({"errcode": 0, "errmsg": "ok"})
+                elif parts.path.endswith("/chat/completions"):
+                    self._stream_chat(json.loads(body.decode("utf-8")))
+                else:
+                    self.send_error(404)
+
+            def _stream_chat(self, request: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def chunk(delta: dict, usage: dict = None):
+                    data = {
+                        "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": request.get("model"),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                    }
+                    if usage is not None:
+                        data["usage"] = usage
+                    self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                time.sleep(stub.llm_ttft)
+                try:
+                    for _ in range(stub.llm_reasoning_tokens):
+                        chunk({"role": "assistant", "content": None, "reasoning_content": "思考"})
+                        time.sleep(stub.llm_token_delay)
+                    for i in range(stub.llm_tokens):
+                        chunk({"content": "<p>分析</p>" if i % 20 == 0 else "分析"})
+                        time.sleep(stub.llm_token_delay)
+                    total = stub.llm_reasoning_tokens + stub.llm_tokens
+                    chunk({}, usage={"prompt_tokens": 0, "completion_tokens": total, "total_tokens": total})
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端因超出时间预算提前断开
+                    pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
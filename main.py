@@ -1,27 +1,62 @@
-import requests
+import asyncio
+import io
 import json
 import logging
+import mimetypes
 import os
+import threading
 import time
 from xml.etree import ElementTree as ET
 
-from requests_toolbelt import MultipartEncoder
+from Analysis.analysis_cache import AnalysisCache, analysis_key
+from Analysis.compaction import PromptCompactor
+from Analysis.fanout import FanOutAnalyzer, section_content
+from Analysis.retrieval import NewsIndex
+from Analysis.streaming import StreamResult, consume_stream
+from Common.log import configure_logging, current_cycle_id, log_correlation
+from Common.metrics import REGISTRY, stage_timer, start_http_server
+from Common.transport import configure_transport
+from Monitor.feed_cache import FeedCache
+from Monitor.fingerprint import changed_sections, content_fingerprint, format_changes
+from Monitor.lease import LeaseCoordinator
+from Monitor.news_store import create_news_store, news_key
+from Monitor.poll_policy import AdaptivePollPolicy, pub_timestamp
+from Monitor.scheduler import AsyncScheduler
+from MsgPush.media_cache import MediaCache
+from MsgPush.notifiers import NotifierDispatcher, create_notifiers
+from MsgPush.outbox import DeliveryWorker, Outbox
+from MsgPush.token_cache import WXCOM_API_BASE
 
-from MsgPush.wx_bot_push import WxComBot
-from openai import OpenAI
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("cs_monitor.log"), logging.StreamHandler()],
-)
 logger = logging.getLogger("cs-monitor")
 
+CONFIG_PATH = "config.json"
+
+
+# 需要从日志中脱敏的密钥
+def collect_secrets(config):
+    secrets = [config["openai"].get("api_key"), config["wx_push"].get("corp_secret")]
+    for notifier_config in config.get("notifiers") or []:
+        secrets.append(notifier_config.get("corp_secret"))
+    return [secret for secret in secrets if secret]
+
+
+# 配置日志，仅由程序入口调用，导入本模块不会修改日志配置
+def setup_logging(config):
+    configure_logging(config.get("logging", {}), secrets=collect_secrets(config))
+
 
-# 加载配置
+# 程序入口的初始化：先加载配置并配置日志，再创建全局对象，启动阶段的日志（历史导入、索引补建等）不会丢失
+def bootstrap():
+    created = not os.path.exists(CONFIG_PATH)
+    config = load_config()
+    setup_logging(config)
+    logger.info(f"创建默认配置文件: {CONFIG_PATH}" if created else "配置加载成功")
+    return init(config)
+
+
+# 加载配置，配置文件不存在时创建默认配置；由入口在配置日志后记录加载结果
 def load_config():
-    config_path = "config.json"
+    config_path = CONFIG_PATH
     if not os.path.exists(config_path):
         # 默认配置
         default_config = {
@@ -29,109 +64,397 @@ def load_config():
                 "enabled": False,
                 "http": "http://127.0.0.1:7897",
                 "https": "http://127.0.0.1:7897",
+                "hosts": ["store.steampowered.com"],  # 需要走代理的主机，留空表示全部
+            },
+            "http": {
+                "connect_timeout": 5,
+                "read_timeout": 30,
+                "retries": 3,  # 仅幂等请求重试
+                "backoff": 0.5,
+                "pool_size": 10,
             },
             "openai": {
                 "api_key": "",
                 "base_url": "https://api.deepseek.com",
                 "model": "deepseek-reasoner",
+                "cache_file": "analysis_cache.json",  # 分析结果缓存，相同请求不再重复调用模型
+                "force_refresh": False,  # 忽略缓存重新分析，新结果会覆盖缓存
+                "cache_ttl": 604800,  # 缓存有效期（秒）
+                "cache_max_entries": 200,
+                "analysis_mode": "batch",  # batch 所有新闻一次分析；per_item 逐条并行分析后合并
+                "max_concurrency": 4,  # per_item 模式同时进行的分析请求上限
+                "compact_prompt": True,  # 分析前将新闻HTML转换为紧凑文本
+                "prompt_token_budget": 6000,  # 单次请求中新闻内容的token预算，超出时截断
+                "latency_budget": 180,  # 单次分析的墙钟时间预算（秒），为空时不限制
+                "on_timeout": "fallback",  # 超出预算时：fallback 改用备用模型；partial 使用已收到的部分结果
+                "fallback_model": "deepseek-chat",
+                "fallback_budget": 60,
+                "keep_reasoning": False,  # 是否保留推理内容
             },
             "wx_push": {
                 "corp_id": "",
                 "corp_secret": "",
                 "agent_id": "1000002",
                 "to_party": "2",
+                "api_base": "https://qyapi.weixin.qq.com",  # 企业微信接口地址，基准测试时指向本地替身服务
+                "token_cache_file": "wx_token.json",  # access_token 持久化缓存
+                "media_cache_file": "wx_media.json",  # 临时素材 media_id 缓存
+                "rate_limit": 0.5,  # 每个应用每秒允许发送的消息数，超出时排队等待
+                "rate_burst": 10,  # 每个应用允许的突发消息数
             },
             "rss": {
                 "url": "https://store.steampowered.com/feeds/news/app/730/?cc=HK&l=schinese",
                 "check_interval": 300,  # 5分钟检查一次
+                "state_file": "rss_state.json",  # 条件请求校验值与内容摘要
+                # 多订阅源，每项包含 url，可选 name / check_interval；为空时使用上面的 url
+                "feeds": [],
+                "max_concurrency": 4,  # 同时检测的订阅源上限
+                "max_workers": 2,  # 同时保存检测结果并写入发件箱的订阅源上限
+                # 自适应轮询：根据历史发布时间在高概率时段加快轮询，空闲时指数退避
+                "adaptive": {
+                    "enabled": True,
+                    "min_interval": 20,
+                    "max_interval": 900,
+                    "hot_interval": 30,
+                    "recent_window": 7200,
+                    "hot_ratio": 2.0,
+                },
+            },
+            "data": {
+                "backend": "sqlite",  # sqlite 或 json（旧版整文件存储）
+                "db_path": "news.db",
+                "json_file_path": "news.json",  # sqlite 后端首次启动时从该文件导入历史
+            },
+            "history": {
+                "enabled": True,  # 分析时附带最相关的历史更新
+                "index_path": "news_index.db",  # 历史新闻检索索引
+                "top_k": 3,  # 最多附带的历史更新条数
+                "byte_budget": 4000,  # 历史参考内容的字节上限
+            },
+            # 推送渠道列表，type 可选 wx / spug / webhook；为空时由 wx_push 与 spug 生成
+            "notifiers": [],
+            "outbox": {
+                "db_path": "outbox.db",  # 发件箱，保存待分析/待推送的消息
+                "channels": [],  # 推送的渠道名称，为空时推送到全部渠道
+                "max_attempts": 8,  # 分析或推送的最大尝试次数
+                "backoff": 30,  # 重试退避基数（秒），指数增长
+                "max_backoff": 3600,
+                "poll_interval": 5,  # 投递线程空闲时的检查间隔（秒）
+                "retention": 30 * 24 * 3600,  # 已送达或失败的消息保留时间（秒），0 表示不清理
+                "analysis_timeout": 900,  # 多实例运行时，分析超过该时间未完成视为实例已退出，由其他实例重新分析
+            },
+            # 多实例运行：共用同一目录（或共享卷）下的数据库，订阅源按实例分片，发件箱只由一个实例投递
+            "coordination": {
+                "enabled": False,
+                "db_path": "coordination.db",
+                "ttl": 60,  # 心跳与租约有效期（秒），实例失联后最迟该时间后被接管
+                "owner": "",  # 实例名，为空时自动生成
+            },
+            "metrics": {
+                "enabled": True,  # 定时任务模式下启动 /metrics 端点
+                "host": "127.0.0.1",
+                "port": 9108,
+                "textfile": "",  # 单次运行模式的指标输出文件，如 /var/lib/node_exporter/cs_monitor.prom
+            },
+            "logging": {
+                "level": "INFO",
+                "file": "cs_monitor.log",
+                "rotate": "size",  # size 按大小轮转；time 按时间轮转
+                "max_bytes": 10485760,
+                "when": "midnight",  # 按时间轮转的周期
+                "backup_count": 7,
+                "compress": True,  # 以 gzip 压缩历史日志
+                "json": False,  # 每行一个 JSON 对象，包含 cycle_id
             },
-            "data": {"json_file_path": "news.json"},
             "spug": {"enabled": True, "url": ""},
         }
         with open(config_path, "w", encoding="utf-8") as f:
             json.dump(default_config, f, ensure_ascii=False, indent=4)
-        logger.info(f"创建默认配置文件: {config_path}")
         return default_config
 
     try:
         with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-        logger.info("配置加载成功")
-        return config
+            return json.load(f)
     except Exception as e:
         logger.error(f"加载配置文件失败: {e}")
         raise
 
 
-# 全局配置
-CONFIG = load_config()
+# 运行指标
+FETCHED_BYTES = REGISTRY.counter("cs_monitor_fetched_bytes_total", "获取的RSS字节数")
+NEWS_ITEMS = REGISTRY.counter("cs_monitor_news_items_total", "解析到的新闻数(kind=seen)与新新闻数(kind=new)")
+LLM_TOKENS = REGISTRY.counter("cs_monitor_llm_tokens_total", "模型输出的token数")
+LLM_TTFT = REGISTRY.histogram("cs_monitor_llm_ttft_seconds", "模型首个token耗时（秒）")
+NOTIFY_LATENCY = REGISTRY.histogram(
+    "cs_monitor_publish_to_notify_seconds", "新闻发布到推送成功的延迟（秒）",
+    buckets=(30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 21600, 86400),
+)
 
-# 设置代理
-proxies = None
-if CONFIG["proxy"]["enabled"]:
-    proxies = {
-        "http": CONFIG["proxy"]["http"],
-        "https": CONFIG["proxy"]["https"],
-    }
+# 以下全局对象由 init() 创建；模型客户端、逐条分析线程池与推送渠道在首次使用时创建，
+# 没有新新闻的单次运行不会导入 openai / requests_toolbelt
+CONFIG = None
+transport = None
+feed_cache = None
+media_cache = None
+analysis_cache = None
+prompt_compactor = None
+outbox = None
+news_store = None
+news_index = None
+delivery_worker = None
+coordinator = None
+client = None
+fanout_analyzer = None
+notifier_dispatcher = None
+# 保护按需创建的全局对象，定时任务模式下多个线程可能同时首次使用
+_lazy_lock = threading.Lock()
+
+
+# 创建运行所需的全局对象，未传入配置时先加载配置，重复调用时直接返回
+def init(config=None):
+    global CONFIG, transport, feed_cache, media_cache, analysis_cache, prompt_compactor, outbox, news_store, \
+        news_index, delivery_worker, coordinator
+    if CONFIG is not None:
+        return CONFIG
+
+    if config is None:
+        config = load_config()
+
+    # 旧版 json 新闻存储不区分订阅源，多个订阅源会共用同一份已有新闻
+    if config["data"].get("backend", "sqlite") == "json" and \
+            len({feed["url"] for feed in config["rss"].get("feeds") or []}) > 1:
+        raise ValueError("json 新闻存储只支持单个订阅源，多订阅源请使用 sqlite 新闻存储")
+
+    # 多实例协调，未启用时为None；多实例可能在不同主机上通过共享卷共用数据库，
+    # WAL 依赖同一主机上的共享内存，此时各数据库改用依赖文件锁的 DELETE 日志模式
+    coordination_config = config.get("coordination", {})
+    journal_mode = "WAL"
+    if coordination_config.get("enabled", False):
+        journal_mode = "DELETE"
+        if config["data"].get("backend", "sqlite") != "sqlite":
+            raise ValueError("多实例运行需要使用 sqlite 新闻存储")
+        coordinator = LeaseCoordinator(
+            coordination_config.get("db_path", "coordination.db"),
+            owner=coordination_config.get("owner") or None,
+            ttl=coordination_config.get("ttl", 60),
+        )
 
-# 初始化OpenAI客户端
-try:
-    client = OpenAI(
-        api_key=CONFIG["openai"]["api_key"], base_url=CONFIG["openai"]["base_url"]
+    # 共享HTTP传输层（连接池、超时、重试与代理）
+    transport = configure_transport(config)
+
+    # RSS条件请求缓存
+    feed_cache = FeedCache(config["rss"].get("state_file", "rss_state.json"))
+
+    # 企业微信临时素材缓存
+    media_cache = MediaCache(config["wx_push"].get("media_cache_file", "wx_media.json"))
+
+    # LLM分析结果缓存
+    analysis_cache = AnalysisCache(
+        config["openai"].get("cache_file", "analysis_cache.json"),
+        ttl=config["openai"].get("cache_ttl", 7 * 24 * 3600),
+        max_entries=config["openai"].get("cache_max_entries", 200),
     )
-    logger.info("OpenAI客户端初始化成功")
-except Exception as e:
-    logger.error(f"OpenAI客户端初始化失败: {e}")
-    client = None
 
+    # 提示词压缩，未启用时为None
+    prompt_compactor = (
+        PromptCompactor(config["openai"].get("prompt_token_budget", 6000))
+        if config["openai"].get("compact_prompt", True)
+        else None
+    )
 
-def get_wx_media_id(file_name, file_path, access_token, file_type):
-    """
+    # 发件箱，检测到的新闻先持久化，再由投递线程分析与推送
+    outbox_config = config.get("outbox", {})
+    outbox = Outbox(
+        outbox_config.get("db_path", "outbox.db"),
+        max_attempts=outbox_config.get("max_attempts", 8),
+        backoff=outbox_config.get("backoff", 30),
+        max_backoff=outbox_config.get("max_backoff", 3600),
+        reclaim_after=outbox_config.get("analysis_timeout", 900) if coordinator is not None else None,
+        retention=outbox_config.get("retention", 30 * 24 * 3600),
+        journal_mode=journal_mode,
+    )
 
-    :param file_name:
-    :param file_path:
-    :param access_token:
-    :param file_type:
+    # 新闻存储
+    news_store = create_news_store(config["data"], config["rss"]["url"], journal_mode=journal_mode)
+
+    # 历史新闻检索索引，未启用时为None
+    history_config = config.get("history", {})
+    if history_config.get("enabled", False):
+        news_index = create_news_index(history_config, news_store, journal_mode=journal_mode)
+
+    # 发件箱投递线程
+    delivery_worker = DeliveryWorker(
+        outbox,
+        analyze=analyze_outbox_entry,
+        deliver=deliver_outbox_entry,
+        poll_interval=outbox_config.get("poll_interval", 5),
+        should_run=(lambda: coordinator.should_run("outbox")) if coordinator is not None else None,
+    )
+
+    CONFIG = config
+    return CONFIG
+
+
+# OpenAI客户端，首次分析时导入 openai 并创建，失败时返回None
+def get_client():
+    global client
+    with _lazy_lock:
+        if client is not None:
+            return client
+        try:
+            from openai import OpenAI
+
+            client = OpenAI(
+                api_key=CONFIG["openai"]["api_key"], base_url=CONFIG["openai"]["base_url"]
+            )
+            logger.info("OpenAI客户端初始化成功")
+        except Exception as e:
+            logger.error(f"OpenAI客户端初始化失败: {e}")
+        return client
+
+
+# 创建历史新闻检索索引，为上次补建后新保存的新闻补建索引；在启动时完成，不占用首次分析的时间
+def create_news_index(history_config, store, journal_mode="WAL"):
+    index = NewsIndex(history_config.get("index_path", "news_index.db"), journal_mode=journal_mode)
+    position = store.position()
+    indexed = index.indexed_position()
+    # 新闻存储被重建时写入位置会变小，从头补建
+    if indexed > position:
+        indexed = 0
+    if indexed < position:
+        started = time.monotonic()
+        added = index.add(store.items_since(indexed))
+        index.set_indexed_position(position)
+        logger.info(f"已为{added}条历史新闻建立检索索引，耗时{time.monotonic() - started:.1f}秒")
+    return index
+
+
+# 与待分析新闻最相关的历史更新，检索失败时不影响分析
+def build_history_context(news_items):
+    if news_index is None:
+        return ""
+    try:
+        history_config = CONFIG["history"]
+        with stage_timer("retrieval"):
+            return news_index.context(
+                news_items, history_config.get("top_k", 3), history_config.get("byte_budget", 4000)
+            )
+    except Exception as e:
+        logger.error(f"历史新闻检索失败: {e}")
+        return ""
+
+
+# 逐条并行分析，首次使用时创建线程池
+def get_fanout_analyzer():
+    global fanout_analyzer
+    with _lazy_lock:
+        if fanout_analyzer is None:
+            fanout_analyzer = FanOutAnalyzer(CONFIG["openai"].get("max_concurrency", 4))
+        return fanout_analyzer
+
+
+def get_wx_media_id(file_name, file_path, access_token, file_type, namespace=None, api_base=None):
+    """
+    获取临时素材media_id，文件内容未变化且素材未过期时复用缓存，否则重新上传
+    :param file_name: 上传表单字段名
+    :param file_path: 文件路径
+    :param access_token: 企业微信access_token
+    :param file_type: 素材类型，如image
+    :param namespace: 素材缓存命名空间，默认为 wx_push.corp_id
+    :param api_base: 企业微信接口地址，默认为 wx_push.api_base
     :return: media_id
     """
-    url = f'https://qyapi.weixin.qq.com/cgi-bin/media/upload?access_token={access_token}&type={file_type}'
+    api_base = api_base or CONFIG["wx_push"].get("api_base", WXCOM_API_BASE)
+    url = f'{api_base}/cgi-bin/media/upload?access_token={access_token}&type={file_type}'
+    namespace = namespace or CONFIG["wx_push"]["corp_id"]
     try:
-        m = MultipartEncoder(
-            fields={file_name: ('file', open(file_path, 'rb'), 'image/jpeg')},
-        )
-        r = requests.post(url=url, data=m, headers={'Content-Type': m.content_type})
-        return r.json()['media_id']
+        digest = media_cache.file_digest(file_path)
+        media_id = media_cache.get(digest, file_type, namespace)
+        if media_id:
+            logger.info('复用已上传的素材')
+            return media_id
+
+        from requests_toolbelt import MultipartEncoder
+
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        with stage_timer("media_upload"), open(file_path, 'rb') as f:
+            m = MultipartEncoder(
+                fields={file_name: ('file', f, content_type)},
+            )
+            r = transport.post(url, data=m, headers={'Content-Type': m.content_type})
+            media_id = r.json()['media_id']
+        media_cache.put(digest, file_type, media_id, namespace)
+        return media_id
     except Exception as e:
         logger.error(f'获取media_id错误{e}')
 
 
-# 获取RSS订阅内容
+# 获取RSS订阅内容，内容未变化时返回None
 def fetch_rss_feed(url):
     try:
         logger.info(f"开始获取RSS: {url}")
-        response = requests.get(url, proxies=proxies, timeout=30)
-        response.raise_for_status()  # 如果状态码不是200，抛出异常
+        with stage_timer("fetch"):
+            response = transport.get(url, headers=feed_cache.request_headers(url))
+            FETCHED_BYTES.inc(len(response.content), feed=url)
+        if response.status_code != 304:
+            response.raise_for_status()  # 如果状态码不是200，抛出异常
+        if feed_cache.is_unchanged(
+            url, response.status_code, response.headers, response.content
+        ):
+            logger.info(
+                f"RSS内容未变化，跳过解析(状态码: {response.status_code}，"
+                f"累计短路{feed_cache.short_circuited()}/{feed_cache.stats['polls']}次)"
+            )
+            return None
         logger.info("RSS获取成功")
         return response.content
-    except requests.RequestException as e:
+    except Exception as e:
         logger.error(f"获取RSS失败: {e}")
         raise
 
 
+# 增量解析RSS内容
+def iter_rss_items(xml_content, known_keys=None):
+    """
+    基于 iterparse 逐条产出新闻，解析完的 item 子树会立即释放
+    Steam 订阅按发布时间倒序排列，指定 known_keys 时遇到已知新闻即停止解析
+    :param xml_content: RSS 内容
+    :param known_keys: 已有新闻的标识集合，为空时解析全部
+    :return: 新闻字典生成器
+    """
+    parent = None
+    for event, elem in ET.iterparse(io.BytesIO(xml_content), events=("start", "end")):
+        if event == "start":
+            if elem.tag == "channel":
+                parent = elem
+            continue
+        if elem.tag != "item":
+            continue
+
+        news_item = {
+            "title": elem.findtext("title"),
+            "link": elem.findtext("link"),
+            "guid": elem.findtext("guid"),
+            "pubDate": elem.findtext("pubDate"),
+            "description": elem.findtext("description"),
+        }
+        elem.clear()
+        if parent is not None:
+            parent.remove(elem)
+
+        if known_keys and news_key(news_item) in known_keys:
+            logger.info(f"遇到已有新闻，停止解析: {news_key(news_item)}")
+            return
+        yield news_item
+
+
 # 解析RSS内容
-def parse_rss_feed(xml_content):
+def parse_rss_feed(xml_content, known_keys=None):
     try:
         logger.info("开始解析RSS内容")
-        root = ET.fromstring(xml_content)
-        news_items = []
-        for item in root.findall(".//item"):
-            news_item = {
-                "title": item.find("title").text,
-                "link": item.find("link").text,
-                "pubDate": item.find("pubDate").text,
-                "description": item.find("description").text,
-            }
-            news_items.append(news_item)
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode("utf-8")
+        news_items = list(iter_rss_items(xml_content, known_keys))
         logger.info(f"解析RSS成功，获取到{len(news_items)}条新闻")
         return news_items
     except Exception as e:
@@ -167,202 +490,512 @@ def load_existing_news(file_path):
 def save_news_to_file(file_path, news_items):
     try:
         logger.info(f"保存新闻数据到: {file_path}")
-        with open(file_path, "w", encoding="utf-8") as file:
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
             json.dump(news_items, file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, file_path)
         logger.info(f"保存了{len(news_items)}条新闻")
     except Exception as e:
         logger.error(f"保存新闻数据失败: {e}")
         raise
 
 
-# 检查是否有新的新闻
+# 检查新的与被编辑的新闻，existing_news 为已有新闻列表或 {标识: 内容指纹} 映射（如 news_store.fingerprints(url, keys)）
+# 被编辑的新闻以 edited=True 标记
 def check_for_new_news(existing_news, new_news):
-    existing_dates = {news["pubDate"] for news in existing_news}
-    new_news_items = [
-        news for news in new_news if news["pubDate"] not in existing_dates
-    ]
-    logger.info(f"检查到{len(new_news_items)}条新闻")
+    if isinstance(existing_news, list):
+        existing_news = {news_key(news): content_fingerprint(news) for news in existing_news}
+    new_news_items = []
+    edited = 0
+    for news in new_news:
+        fingerprint = existing_news.get(news_key(news))
+        if fingerprint is None:
+            new_news_items.append(news)
+        elif fingerprint != content_fingerprint(news):
+            new_news_items.append({**news, "edited": True})
+            edited += 1
+    logger.info(f"检查到{len(new_news_items) - edited}条新闻，{edited}条被编辑")
     return new_news_items
 
 
-# ds分析
-def ds_analysis(messages):
-    if client is None:
-        logger.error("OpenAI客户端未初始化，无法进行分析")
-        return "分析服务暂时不可用，请稍后再试"
+# 被编辑的新闻只保留新增或修改的内容用于分析与推送
+def change_view(news):
+    if not news.get("edited"):
+        return news
+    return {
+        "title": f"{news['title']}（内容更新）",
+        "link": news["link"],
+        "pubDate": news["pubDate"],
+        "description": news["changes"],
+        "edited": True,
+    }
 
+
+# 保存到新闻存储的内容，不包含编辑标记与变更内容
+def stored_news(news):
+    return {key: value for key, value in news.items() if key not in ("edited", "changes")}
+
+
+# 调用模型分析，失败时抛出异常
+def request_analysis(messages, force_refresh=False):
+    """
+    调用模型分析，相同模型与消息内容的结果会被缓存
+    :param messages: 发送给模型的消息列表
+    :param force_refresh: 是否忽略缓存重新分析
+    :return: 分析结果
+    """
+    if get_client() is None:
+        raise RuntimeError("OpenAI客户端未初始化")
+
+    model = CONFIG["openai"]["model"]
+    cache_key = analysis_key(model, messages)
+    if not force_refresh:
+        cached = analysis_cache.get(cache_key)
+        if cached is not None:
+            stats = analysis_cache.stats
+            logger.info(
+                f"复用缓存的AI分析结果(命中{stats['hits']}次/未命中{stats['misses']}次，"
+                f"累计节省{stats['saved_seconds']:.1f}秒)"
+            )
+            return cached
+
+    openai_config = CONFIG["openai"]
+    budget = openai_config.get("latency_budget")
+    result = stream_analysis(model, messages, budget)
+    if not result.timed_out:
+        if result.content:
+            analysis_cache.put(cache_key, result.content, result.elapsed)
+        return result.content
+
+    # 超出时间预算，不缓存不完整或降级的结果
+    fallback_model = openai_config.get("fallback_model")
+    if openai_config.get("on_timeout", "fallback") == "partial" and result.content:
+        logger.warning(f"AI分析超出{budget}秒预算，使用已收到的部分结果")
+        return result.content
+    if fallback_model:
+        logger.warning(f"AI分析超出{budget}秒预算，改用备用模型{fallback_model}")
+        try:
+            fallback = stream_analysis(fallback_model, messages, openai_config.get("fallback_budget"))
+            if fallback.content:
+                return fallback.content
+        except Exception as e:
+            logger.error(f"备用模型分析失败: {e}")
+    if result.content:
+        logger.warning(f"AI分析超出{budget}秒预算，使用已收到的部分结果")
+        return result.content
+    raise TimeoutError(f"AI分析超出{budget}秒预算且没有可用结果")
+
+
+# 流式调用模型，budget 为墙钟时间预算（秒），为空时不限制
+def stream_analysis(model, messages, budget=None):
+    from openai import APITimeoutError
+
+    logger.info(f"开始AI分析，模型: {model}")
+    started = time.monotonic()
+    deadline = started + budget if budget else None
+    openai_client = get_client()
+    if budget:
+        # SDK 默认的重试会让一次超时变成数倍预算，有预算时不重试，由备用模型兜底
+        openai_client = openai_client.with_options(timeout=budget, max_retries=0)
     try:
-        logger.info("开始AI分析")
-        response = client.chat.completions.create(
-            model=CONFIG["openai"]["model"], messages=messages, stream=True
+        response = openai_client.chat.completions.create(model=model, messages=messages, stream=True)
+    except APITimeoutError:
+        # 等待首个响应就已超出预算
+        return StreamResult("", "", None, time.monotonic() - started, 0, True)
+
+    logger.info("开始接收AI分析结果")
+    with stage_timer("llm", model=model):
+        result = consume_stream(
+            response, started, deadline=deadline,
+            keep_reasoning=CONFIG["openai"].get("keep_reasoning", False),
+        )
+    LLM_TOKENS.inc(result.tokens, model=model)
+    if result.ttft is not None:
+        LLM_TTFT.observe(result.ttft, model=model)
+    ttft = f"{result.ttft:.1f}秒" if result.ttft is not None else "无"
+    logger.info(
+        f"AI分析{'超时中断' if result.timed_out else '完成'}，模型: {model}，首token耗时{ttft}，"
+        f"总耗时{result.elapsed:.1f}秒，{result.tokens}个token，{result.tokens_per_second:.1f} token/s"
+    )
+    return result
+
+
+# 构造用户消息，启用压缩时发送紧凑文本，否则发送原始新闻列表
+def build_user_content(news_items):
+    if prompt_compactor is None:
+        return f"{news_items}"
+    return prompt_compactor.compact(news_items)
+
+
+# 构造分析消息
+def build_analysis_messages(news_items):
+    messages = [
+        {
+            "role": "system",
+            "content": f"你是一个精通CS2饰品市场经济的专家,根据用户提供的内容更新日志或者新闻内容,参考受更新影响饰品以往形势来给出受影响的饰品道具,简单明确;【给我答案是图文消息的内容，支持html标签,去除开头的html，需要简单美化页面，不超过666 K个字节（支持id转译）】"
+                       f"返回的答案请给我格式化的文本格式,答案格式如标题:CSGO更新,日期:20xx/x/x,"
+                       f"更新新闻链接:(我发给您的link放到这里就行)"
+                       f"受本次影响的武器类型:"
+                       f"您的分析内容:",
+        },
+        {"role": "user", "content": build_user_content(news_items)},
+    ]
+    history = build_history_context(news_items)
+    if history:
+        messages[1]["content"] += f"\n\n以往相关更新（供参考受影响饰品以往形势）:\n{history}"
+    return messages
+
+
+# 按新闻生成图文消息文章，sections 与新闻一一对应时每条新闻一篇，否则分析结果作为第一篇、其余新闻附原文
+def build_articles(news_items, sections):
+    if len(news_items) > 1 and len(sections) == len(news_items):
+        return [
+            {"title": news["title"], "content": section, "url": news["link"]}
+            for news, section in zip(news_items, sections)
+        ]
+    title = news_items[0]["title"] if news_items[0].get("edited") else "CS2更新发布"
+    articles = [{"title": title, "content": sections[0], "url": news_items[0]["link"]}]
+    for news in news_items[1:]:
+        articles.append({
+            "title": news["title"],
+            "content": news.get("description") or news["link"],
+            "url": news["link"],
+        })
+    return articles
+
+
+# 分析新新闻，per_item 模式下多条新闻逐条并行分析，返回图文消息文章列表；force_refresh 时忽略分析缓存
+def analyze_news(news_items, force_refresh=False):
+    if CONFIG["openai"].get("analysis_mode", "batch") != "per_item" or len(news_items) <= 1:
+        return build_articles(
+            news_items, [request_analysis(build_analysis_messages(news_items), force_refresh=force_refresh)]
         )
 
-        reasoning_content = ""
-        content = ""
-
-        logger.info("开始接收AI分析结果")
-        for chunk in response:
-            if chunk.choices[0].delta.reasoning_content:
-                reasoning_chunk = chunk.choices[0].delta.reasoning_content
-                reasoning_content += reasoning_chunk
-            elif chunk.choices[0].delta.content:
-                content_chunk = chunk.choices[0].delta.content
-                content += content_chunk
+    if get_client() is None:
+        raise RuntimeError("OpenAI客户端未初始化")
 
-        logger.info("AI分析完成")
-        return content
-    except Exception as e:
-        logger.error(f"AI分析失败: {e}")
-        return f"分析过程中出现错误: {str(e)}"
+    results = get_fanout_analyzer().analyze(
+        news_items, lambda news: request_analysis(build_analysis_messages([news]), force_refresh=force_refresh)
+    )
+    if all(result["error"] is not None for result in results):
+        raise RuntimeError(results[0]["error"])
+    return build_articles(news_items, [section_content(result) for result in results])
+
+
+# 推送渠道配置，未配置 notifiers 时由 wx_push / spug 生成
+def get_notifier_configs():
+    if CONFIG.get("notifiers"):
+        return CONFIG["notifiers"]
+    wx_config = CONFIG["wx_push"]
+    channel_configs = [
+        {
+            "name": "wx",
+            "type": "wx",
+            "corp_id": wx_config["corp_id"],
+            "corp_secret": wx_config["corp_secret"],
+            "agent_id": wx_config["agent_id"],
+            "to_party": wx_config["to_party"],
+            "rate_limit": wx_config.get("rate_limit", 0.5),
+            "rate_burst": wx_config.get("rate_burst", 10),
+            "api_base": wx_config.get("api_base", WXCOM_API_BASE),
+        }
+    ]
+    if CONFIG["spug"].get("enabled") and CONFIG["spug"].get("url"):
+        channel_configs.append({"name": "spug", "type": "spug", "url": CONFIG["spug"]["url"]})
+    return channel_configs
+
+
+# 企业微信图文消息缩略图，按企业区分素材缓存
+def wx_thumb_media_id(wx_com_bot):
+    return get_wx_media_id(file_name='media.jpg', file_path='media.jpg', access_token=wx_com_bot.get_token(),
+                           file_type='image', namespace=wx_com_bot.corp_id, api_base=wx_com_bot.api_base)
+
+
+# 推送渠道，多个渠道并发推送，首次推送时创建
+def get_notifier_dispatcher():
+    global notifier_dispatcher
+    with _lazy_lock:
+        if notifier_dispatcher is None:
+            notifier_dispatcher = NotifierDispatcher(
+                create_notifiers(
+                    get_notifier_configs(),
+                    wx={
+                        "token_cache_path": CONFIG["wx_push"].get("token_cache_file", "wx_token.json"),
+                        "thumb_media_id": wx_thumb_media_id,
+                    },
+                )
+            )
+        return notifier_dispatcher
 
 
 # 聚合消息推送
-def msg_push(wx_push=False, spug=False, media_id=None, messages=None, news_url=None):
+def msg_push(articles, news_items=None, channels=None):
     """
-    聚合消息推送
-    :param wx_push: 是否推送微信,默认否
-    :param spug: 推送spug平台，默认否
-    :param messages: 消息内容
-    :param news_url: 新闻链接
-    :return: 是否推送成功
+    聚合消息推送，各渠道并发推送
+    :param articles: 文章列表 [{"title", "content", "url"}]，企业微信每条消息最多合并 8 篇
+    :param news_items: 本条消息对应的新闻列表
+    :param channels: 渠道名称列表，为空时推送到全部渠道
+    :return: 每个渠道的结果 {name: 错误信息}，成功时为 None，结果未知时为 Unconfirmed
     """
-    success = True
+    message = {
+        "title": "CS2更新发布",
+        "content": "<hr/>".join(article["content"] for article in articles),
+        "url": articles[0]["url"],
+        "news_items": news_items or [],
+        "articles": articles,
+    }
+    return get_notifier_dispatcher().dispatch(message, channels)
 
-    if spug and CONFIG["spug"]["enabled"]:
-        try:
-            logger.info("开始推送到Spug")
-            push_result = requests.get(
-                f'{CONFIG["spug"]["url"]}?content=CS2已发布更新,请查看微信分析消息',
-                timeout=10,
-            )
-            push_result.raise_for_status()
-            logger.info("Spug推送成功")
-        except Exception as e:
-            logger.error(f"Spug推送失败: {e}")
-            success = False
 
-    if wx_push:
-        try:
-            logger.info("开始推送到企业微信")
-            wx_com_bot = WxComBot(
-                CONFIG["wx_push"]["corp_id"], CONFIG["wx_push"]["corp_secret"]
-            )
-            wx_com_bot.send_mpnews_msg(
-                agentid=CONFIG["wx_push"]["agent_id"],
-                toparty=CONFIG["wx_push"]["to_party"],
-                articles=[
-                    {
-                        "title": "CS2更新发布",
-                        "thumb_media_id": media_id,
-                        "author": "cs2bot",
-                        "content_source_url": news_url,
-                        "content": messages,
-                        "digest": "",
-                    }
-                ],
-            )
-            logger.info("企业微信推送成功")
-        except Exception as e:
-            logger.error(f"企业微信推送失败: {e}")
-            success = False
+# 分析发件箱中的消息，多次失败后以错误信息代替分析结果，保证通知仍能送达
+def analyze_outbox_entry(entry):
+    try:
+        articles = analyze_news(entry["news_items"], force_refresh=CONFIG["openai"].get("force_refresh", False))
+    except Exception as e:
+        logger.error(f"消息{entry['id']}分析失败: {e}")
+        if outbox.analysis_failed(entry["id"], str(e)):
+            articles = build_articles(entry["news_items"], [f"分析过程中出现错误: {str(e)}"])
+            outbox.mark_analyzed(entry["id"], json.dumps(articles, ensure_ascii=False))
+        return
+    outbox.mark_analyzed(entry["id"], json.dumps(articles, ensure_ascii=False))
 
-    return success
 
+# 投递发件箱中的消息到指定渠道
+def deliver_outbox_entry(entry, channels):
+    news_items = entry["news_items"]
+    try:
+        articles = json.loads(entry["analysis"])
+    except ValueError:
+        # 旧版发件箱保存的是分析结果文本
+        articles = build_articles(news_items, [entry["analysis"]])
+    results = msg_push(articles, news_items=news_items, channels=channels)
+
+    # 记录发布到推送成功的延迟，结果未知的渠道不计入
+    now = time.time()
+    for channel, error in results.items():
+        if error is not None:
+            continue
+        for news in news_items:
+            # 被编辑的新闻发布时间早于本次编辑，不计入延迟
+            if news.get("edited"):
+                continue
+            published_at = pub_timestamp(news["pubDate"])
+            if published_at is not None:
+                NOTIFY_LATENCY.observe(max(0.0, now - published_at), channel=channel)
+    return results
+
+
+# 检测订阅源中的新新闻
+def detect_new_news(rss_url):
+    # 获取RSS订阅内容
+    xml_content = fetch_rss_feed(rss_url)
+    if xml_content is None:
+        return []
 
-# 主函数
-def main():
+    # 解析RSS内容，已有新闻也可能被编辑，不提前停止
+    with stage_timer("parse"):
+        new_news = parse_rss_feed(xml_content)
+
+    # 读取本次出现的新闻已保存的内容指纹
+    with stage_timer("load"):
+        known = news_store.fingerprints(rss_url, [news_key(news) for news in new_news])
+
+    # 检查新的与被编辑的新闻，被编辑的新闻按段落比较出新增或修改的内容
+    with stage_timer("diff"):
+        new_news_items = check_for_new_news(known, new_news)
+        for news in new_news_items:
+            if news.get("edited"):
+                previous = news_store.get(rss_url, news_key(news)) or {}
+                news["changes"] = format_changes(
+                    changed_sections(previous.get("description"), news.get("description"))
+                )
+    edited = sum(1 for news in new_news_items if news.get("edited"))
+    NEWS_ITEMS.inc(len(new_news), feed=rss_url, kind="seen")
+    NEWS_ITEMS.inc(len(new_news_items) - edited, feed=rss_url, kind="new")
+    NEWS_ITEMS.inc(edited, feed=rss_url, kind="edited")
+    if not new_news_items:
+        feed_cache.commit(rss_url)
+        logger.info("没有发现新的新闻")
+    return new_news_items
+
+
+# 新新闻写入发件箱，分析与投递由发件箱线程完成；被编辑的新闻只分析与推送变更内容
+def handle_new_news(rss_url, new_news_items):
+    logger.info(f"发现{len(new_news_items)}条新闻")
+    for news in new_news_items:
+        logger.info(f"{'编辑' if news.get('edited') else '标题'}: {news['title']}")
+        logger.info(f"链接: {news['link']}")
+        logger.info(f"发布日期: {news['pubDate']}")
+    added = [stored_news(news) for news in new_news_items if not news.get("edited")]
+    edited = [stored_news(news) for news in new_news_items if news.get("edited")]
+    # 只删除了内容的编辑不再推送，仅更新保存的内容
+    notify_items = [change_view(news) for news in new_news_items if not news.get("edited") or news.get("changes")]
+
+    # 先持久化检测结果，之后的分析与推送失败由发件箱重试，不再重复检测
+    entry_id = None
+    if notify_items:
+        channels = CONFIG.get("outbox", {}).get("channels") or list(get_notifier_dispatcher().notifiers)
+        entry_id = outbox.enqueue(rss_url, notify_items, channels, cycle_id=current_cycle_id())
+    news_store.add(rss_url, added)
+    news_store.update(rss_url, edited)
+    feed_cache.commit(rss_url)
     try:
-        logger.info("开始执行主程序")
+        if news_index is not None:
+            news_index.add(added)
+            news_index.update(edited)
+    except Exception as e:
+        logger.error(f"更新历史新闻检索索引失败: {e}")
+    if entry_id is None:
+        logger.info("编辑只删除了内容，不再推送")
+        return None
+    logger.info(f"新闻已写入发件箱: {entry_id}")
+
+    # 分析与推送由发件箱线程完成，耗时较长的分析不会推迟该订阅源的下一次轮询
+    delivery_worker.wake()
+    return entry_id
+
+
+# 多实例运行时只检测分配给当前实例且取得租约的订阅源
+def should_poll(feed):
+    if coordinator is None or coordinator.should_run(feed["url"]):
+        return True
+    logger.debug(f"订阅源[{feed['name']}]由其他实例负责，跳过")
+    return False
+
+
+# 获取订阅源列表，未配置 rss.feeds 时使用 rss.url
+def get_feeds():
+    rss_config = CONFIG["rss"]
+    feeds = rss_config.get("feeds") or [{"url": rss_config["url"]}]
+    return [
+        {
+            "name": feed.get("name", feed["url"]),
+            "url": feed["url"],
+            "check_interval": feed.get("check_interval", rss_config["check_interval"]),
+        }
+        for feed in feeds
+    ]
 
-        # 获取RSS订阅内容
-        xml_content = fetch_rss_feed(CONFIG["rss"]["url"])
 
-        # 解析RSS内容
-        new_news = parse_rss_feed(xml_content)
+# 主函数
+def main():
+    init()
+    logger.info("开始执行主程序")
+    if coordinator is not None:
+        coordinator.heartbeat()
+    for feed in get_feeds():
+        if not should_poll(feed):
+            continue
+        with log_correlation():
+            try:
+                logger.info(f"检查订阅源: {feed['name']}")
+                new_news_items = detect_new_news(feed["url"])
+                if new_news_items:
+                    handle_new_news(feed["url"], new_news_items)
+            except Exception as e:
+                logger.error(f"主程序执行出错: {e}", exc_info=True)
+
+    # 处理本次及以往未完成的分析与推送
+    delivery_worker.run_once()
+    logger.info(f"发件箱状态: {outbox.counts()}")
+    # 释放本次取得的租约，下次运行的实例名不同，无需等待租约过期
+    if coordinator is not None:
+        coordinator.stop()
+
+    # 保存轮询统计与分析缓存的命中统计，运行过程中只在内存中累计
+    feed_cache.flush()
+    analysis_cache.flush()
+
+    # 单次运行模式输出指标文件，供 node_exporter textfile collector 采集
+    textfile = CONFIG.get("metrics", {}).get("textfile")
+    if textfile:
+        REGISTRY.write_textfile(textfile)
+
+
+# 创建自适应轮询策略，未启用时返回None
+def create_poll_policy(feeds):
+    adaptive_config = dict(CONFIG["rss"].get("adaptive", {}))
+    if not adaptive_config.pop("enabled", False):
+        return None
+    poll_policy = AdaptivePollPolicy(**adaptive_config)
+    for feed in feeds:
+        poll_policy.learn(feed["url"], (news["pubDate"] for news in news_store.items(feed["url"])))
+    return poll_policy
+
+
+# 定时任务模式下同一订阅源的检测与处理在不同线程中执行，记录每个订阅源当前一轮的关联 id
+_feed_cycle_ids = {}
+# 由其他实例负责的订阅源，不计入自适应轮询
+_standby_feeds = set()
+
+
+def detect_feed(feed):
+    if not should_poll(feed):
+        _standby_feeds.add(feed["url"])
+        return []
+    _standby_feeds.discard(feed["url"])
+    with log_correlation() as cycle_id:
+        _feed_cycle_ids[feed["url"]] = cycle_id
+        return detect_new_news(feed["url"])
 
-        # 加载已有的新闻数据
-        existing_news = load_existing_news(CONFIG["data"]["json_file_path"])
-
-        # 检查是否有新的新闻
-        new_news_items = check_for_new_news(existing_news, new_news)
-
-        if new_news_items:
-            logger.info(f"发现{len(new_news_items)}条新闻")
-            for news in new_news_items:
-                logger.info(f"标题: {news['title']}")
-                logger.info(f"链接: {news['link']}")
-                logger.info(f"发布日期: {news['pubDate']}")
-
-            # 发现新的新闻推送到spug
-            # msg_push(spug=True)
-
-            # 获取微信素材id
-            access_token = WxComBot(
-                CONFIG["wx_push"]["corp_id"], CONFIG["wx_push"]["corp_secret"]
-            ).get_token()
-            logger.info(f'微信token:{access_token}')
-            media_id = get_wx_media_id(file_name='media.jpg', file_path='media.jpg', access_token=access_token,
-                                       file_type='image')
-            logger.info(f'media_id:{media_id}')
-
-            # 推送新闻到deepseek做饰品数据市场分析
-            messages = [
-                {
-                    "role": "system",
-                    "content": f"你是一个精通CS2饰品市场经济的专家,根据用户提供的内容更新日志或者新闻内容,参考受更新影响饰品以往形势来给出受影响的饰品道具,简单明确;【给我答案是图文消息的内容，支持html标签,去除开头的html，需要简单美化页面，不超过666 K个字节（支持id转译）】"
-                               f"返回的答案请给我格式化的文本格式,答案格式如标题:CSGO更新,日期:20xx/x/x,"
-                               f"更新新闻链接:(我发给您的link放到这里就行)"
-                               f"受本次影响的武器类型:"
-                               f"您的分析内容:",
-                },
-                {"role": "user", "content": f"{new_news_items}"},
-            ]
-            analysis_answer = ds_analysis(messages)
-
-            # 获取最终结果推送到微信机器人
-            push_success = msg_push(
-                wx_push=True,
-                messages=analysis_answer,
-                news_url=new_news_items[0]["link"],
-                media_id=media_id
-            )
 
-            if push_success:
-                # 将新的新闻添加到已有的新闻数据中
-                existing_news.extend(new_news_items)
+def handle_feed(feed, news_items):
+    with log_correlation(_feed_cycle_ids.get(feed["url"])):
+        return handle_new_news(feed["url"], news_items)
 
-                # 保存更新后的新闻数据到JSON文件
-                save_news_to_file(CONFIG["data"]["json_file_path"], existing_news)
-                logger.info("新闻数据已更新")
-            else:
-                logger.warning("由于推送失败，新闻数据未更新")
-        else:
-            logger.info("没有发现新的新闻")
 
-    except Exception as e:
-        logger.error(f"主程序执行出错: {e}", exc_info=True)
+# 下次轮询间隔；由其他实例负责的订阅源按 ttl / 3 检查是否需要接管，接管延迟不受自适应轮询的退避影响
+def feed_interval(feed, news_items, poll_policy):
+    if feed["url"] in _standby_feeds:
+        return coordinator.ttl / 3
+    if poll_policy is not None:
+        return poll_policy.next_interval(feed["url"], news_items)
+    return feed["check_interval"]
 
 
 # 定时执行任务
 def run_scheduler():
-    logger.info("启动定时任务")
-    check_interval = CONFIG["rss"]["check_interval"]
-
-    while True:
-        try:
-            main()
-            logger.info(f"等待{check_interval}秒后再次检查")
-            time.sleep(check_interval)
-        except KeyboardInterrupt:
-            logger.info("程序被用户中断")
-            break
-        except Exception as e:
-            logger.error(f"定时任务出错: {e}", exc_info=True)
-            logger.info(f"等待{check_interval}秒后重试")
-            time.sleep(check_interval)
+    init()
+    feeds = get_feeds()
+    poll_policy = create_poll_policy(feeds)
+    next_interval = lambda feed, news_items: feed_interval(feed, news_items, poll_policy)
+
+    scheduler = AsyncScheduler(
+        feeds,
+        detect=detect_feed,
+        handle=handle_feed,
+        max_concurrency=CONFIG["rss"].get("max_concurrency", 4),
+        max_workers=CONFIG["rss"].get("max_workers", 2),
+        next_interval=next_interval,
+    )
+    metrics_config = CONFIG.get("metrics", {})
+    metrics_server = None
+    if metrics_config.get("enabled", False):
+        metrics_server = start_http_server(metrics_config.get("port", 9108), metrics_config.get("host", "127.0.0.1"))
+
+    if coordinator is not None:
+        coordinator.start()
+    delivery_worker.start()
+    try:
+        asyncio.run(scheduler.run())
+    except KeyboardInterrupt:
+        logger.info("程序被用户中断")
+    finally:
+        delivery_worker.stop()
+        feed_cache.flush()
+        analysis_cache.flush()
+        if coordinator is not None:
+            coordinator.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if poll_policy is not None:
+            logger.info(
+                f"共轮询{poll_policy.polls}次，检测延迟中位数: {poll_policy.median_detection_latency()}秒"
+            )
 
 
 if __name__ == "__main__":
+    bootstrap()
     try:
         # 如果需要定时执行，取消下面的注释
         # run_scheduler()
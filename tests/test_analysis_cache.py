@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from Analysis.analysis_cache import AnalysisCache
+
+
+def test_get_does_not_write_file(tmp_path):
+    path = str(tmp_path / "analysis_cache.json")
+    cache = AnalysisCache(path)
+    assert cache.get("missing") is None
+    assert not os.path.exists(path)
+
+    cache.put("key", "分析结果", 12.5)
+    mtime = os.stat(path).st_mtime_ns
+    assert cache.get("key") == "分析结果"
+    assert cache.get("missing") is None
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_flush_saves_stats(tmp_path):
+    path = str(tmp_path / "analysis_cache.json")
+    cache = AnalysisCache(path)
+    cache.put("key", "分析结果", 12.5)
+    cache.get("key")
+    cache.get("missing")
+    cache.flush()
+
+    with open(path, "r", encoding="utf-8") as f:
+        stats = json.load(f)["stats"]
+    assert stats == {"hits": 1, "misses": 1, "saved_seconds": 12.5}
+    assert AnalysisCache(path).stats == stats
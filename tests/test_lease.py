@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from Monitor.lease import LeaseCoordinator
+
+FEEDS = [f"https://example.com/feed/{i}" for i in range(20)]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "coordination.db")
+
+
+def test_feeds_are_split_between_live_members(db_path):
+    first = LeaseCoordinator(db_path, owner="a", ttl=60)
+    second = LeaseCoordinator(db_path, owner="b", ttl=60)
+    first.heartbeat()
+    second.heartbeat()
+    first.heartbeat()
+
+    assert first.members() == ["a", "b"]
+    owners = {feed: first.assigned_owner(feed) for feed in FEEDS}
+    assert owners == {feed: second.assigned_owner(feed) for feed in FEEDS}
+    assert set(owners.values()) == {"a", "b"}
+    for feed, owner in owners.items():
+        assert first.should_run(feed) == (owner == "a")
+        assert second.should_run(feed) == (owner == "b")
+    first.close()
+    second.close()
+
+
+def test_lease_blocks_others_until_expired(db_path):
+    first = LeaseCoordinator(db_path, owner="a", ttl=60)
+    second = LeaseCoordinator(db_path, owner="b", ttl=60)
+    assert first.acquire("outbox")
+    assert not second.acquire("outbox")
+
+    # 租约过期后由其他实例接管
+    first._conn.execute("UPDATE leases SET expires_at = ? WHERE name = ?", (time.time() - 1, "outbox"))
+    assert second.acquire("outbox")
+    assert not first.acquire("outbox")
+    first.close()
+    second.close()
+
+
+def test_heartbeat_renews_held_leases(db_path):
+    coordinator = LeaseCoordinator(db_path, owner="a", ttl=60)
+    coordinator.acquire("outbox")
+    coordinator._conn.execute("UPDATE leases SET expires_at = ? WHERE name = ?", (time.time() + 1, "outbox"))
+    coordinator.heartbeat()
+    expires_at = coordinator._conn.execute("SELECT expires_at FROM leases WHERE name = ?", ("outbox",)).fetchone()[0]
+    assert expires_at > time.time() + 50
+    coordinator.close()
+
+
+def test_expired_member_feeds_are_taken_over(db_path):
+    first = LeaseCoordinator(db_path, owner="a", ttl=60)
+    second = LeaseCoordinator(db_path, owner="b", ttl=60)
+    first.heartbeat()
+    second.heartbeat()
+    owned = [feed for feed in FEEDS if first.should_run(feed)]
+    assert owned
+
+    # 实例 a 失联：心跳与租约都已过期
+    second._conn.execute("UPDATE members SET expires_at = ? WHERE owner = ?", (time.time() - 1, "a"))
+    second._conn.execute("UPDATE leases SET expires_at = ? WHERE owner = ?", (time.time() - 1, "a"))
+    assert second.heartbeat() == ["b"]
+    assert all(second.should_run(feed) for feed in FEEDS)
+    first.close()
+    second.close()
+
+
+def test_stop_releases_leases_for_immediate_takeover(db_path):
+    first = LeaseCoordinator(db_path, owner="a", ttl=60)
+    second = LeaseCoordinator(db_path, owner="b", ttl=60)
+    first.start()
+    assert first.acquire("outbox")
+    first.stop()
+
+    assert second.heartbeat() == ["b"]
+    assert second.should_run("outbox")
+    first.close()
+    second.close()
+
+
+def test_release_on_reassignment(db_path):
+    coordinator = LeaseCoordinator(db_path, owner="a", ttl=60)
+    coordinator.heartbeat()
+    assert coordinator.should_run("outbox")
+    other = LeaseCoordinator(db_path, owner="b", ttl=60)
+    other.heartbeat()
+    coordinator.heartbeat()
+    feed = next(feed for feed in FEEDS if coordinator.assigned_owner(feed) == "b")
+    coordinator.acquire(feed)
+    # 订阅源分配给其他实例后释放租约，其他实例无需等待过期
+    assert not coordinator.should_run(feed)
+    assert other.should_run(feed)
+    coordinator.close()
+    other.close()
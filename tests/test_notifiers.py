@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import pytest
+import requests
+
+from MsgPush.notifiers import Notifier, NotifierDispatcher
+from MsgPush.outbox import Unconfirmed
+
+MESSAGE = {"title": "CS2更新发布", "content": "内容", "url": "https://example.com/1", "news_items": [], "articles": []}
+
+
+class FakeNotifier(Notifier):
+    def __init__(self, name: str, error: Exception = None, idempotent: bool = False):
+        super().__init__(name)
+        self.error = error
+        self.idempotent = idempotent
+        self.sent = 0
+
+    def send(self, message: dict):
+        self.sent += 1
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def dispatch():
+    dispatchers = []
+
+    def dispatch(*notifiers):
+        dispatcher = NotifierDispatcher({notifier.name: notifier for notifier in notifiers})
+        dispatchers.append(dispatcher)
+        return dispatcher.dispatch(MESSAGE)
+
+    yield dispatch
+    for dispatcher in dispatchers:
+        dispatcher.shutdown()
+
+
+def test_each_channel_reports_its_own_result(dispatch):
+    results = dispatch(FakeNotifier("ok"), FakeNotifier("down", RuntimeError("errcode 45009")))
+    assert results == {"ok": None, "down": "errcode 45009"}
+
+
+def test_read_timeout_is_unconfirmed_for_non_idempotent_channel(dispatch):
+    # 渠道将请求异常包装为其他异常时同样识别
+    try:
+        try:
+            raise requests.ReadTimeout("read timed out")
+        except requests.ReadTimeout as e:
+            raise RuntimeError("推送失败") from e
+    except RuntimeError as e:
+        wrapped = e
+    results = dispatch(FakeNotifier("spug", wrapped))
+    assert isinstance(results["spug"], Unconfirmed)
+
+
+def test_read_timeout_is_retried_for_idempotent_channel(dispatch):
+    results = dispatch(FakeNotifier("wx", requests.ReadTimeout("read timed out"), idempotent=True))
+    assert results["wx"] is not None
+    assert not isinstance(results["wx"], Unconfirmed)
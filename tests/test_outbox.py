@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from Common.log import current_cycle_id
+from MsgPush.outbox import (
+    ANALYZED, ANALYZING, DELIVERED, DETECTED, FAILED, PENDING, UNCONFIRMED, DeliveryWorker, Outbox, Unconfirmed,
+)
+
+NEWS = [{"title": "CS2 更新", "link": "https://example.com/1", "pubDate": "Fri, 28 Feb 2025 00:38:11 +0000"}]
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"), max_attempts=2, backoff=10)
+    yield box
+    box.close()
+
+
+def state_of(outbox: Outbox, entry_id: int) -> str:
+    return outbox._conn.execute("SELECT state FROM outbox WHERE id = ?", (entry_id,)).fetchone()[0]
+
+
+def delivery_of(outbox: Outbox, entry_id: int, channel: str) -> tuple:
+    return outbox._conn.execute(
+        "SELECT state, attempts, next_attempt_at FROM outbox_delivery WHERE outbox_id = ? AND channel = ?",
+        (entry_id, channel),
+    ).fetchone()
+
+
+def analyzed_entry(outbox: Outbox, channels: list) -> int:
+    entry_id = outbox.enqueue("feed", NEWS, channels)
+    outbox.claim_analysis(entry_id)
+    outbox.mark_analyzed(entry_id, "analysis")
+    return entry_id
+
+
+def test_claim_analysis_is_exclusive(outbox):
+    entry_id = outbox.enqueue("feed", NEWS, ["wx"])
+
+    entry = outbox.claim_analysis()
+    assert entry["id"] == entry_id
+    assert entry["news_items"] == NEWS
+    assert state_of(outbox, entry_id) == ANALYZING
+    assert outbox.claim_analysis() is None
+    assert outbox.claim_analysis(entry_id) is None
+
+
+def test_restart_requeues_unfinished_analysis(tmp_path):
+    db_path = str(tmp_path / "outbox.db")
+    first = Outbox(db_path)
+    entry_id = first.enqueue("feed", NEWS, ["wx"])
+    first.claim_analysis(entry_id)
+    first.close()
+
+    second = Outbox(db_path)
+    assert state_of(second, entry_id) == DETECTED
+    assert second.claim_analysis()["id"] == entry_id
+    second.close()
+
+
+def test_stale_analysis_is_reclaimed_only_after_timeout(tmp_path):
+    db_path = str(tmp_path / "outbox.db")
+    first = Outbox(db_path, reclaim_after=60)
+    entry_id = first.enqueue("feed", NEWS, ["wx"])
+    first.claim_analysis(entry_id)
+
+    # 共用发件箱时不在启动时重置分析中的消息
+    second = Outbox(db_path, reclaim_after=60)
+    assert state_of(second, entry_id) == ANALYZING
+    assert second.claim_analysis() is None
+
+    second._conn.execute("UPDATE outbox SET updated_at = ? WHERE id = ?", (time.time() - 61, entry_id))
+    second._conn.commit()
+    assert second.claim_analysis()["id"] == entry_id
+    first.close()
+    second.close()
+
+
+def test_analysis_failed_backs_off_then_gives_up(outbox):
+    entry_id = outbox.enqueue("feed", NEWS, ["wx"])
+    outbox.claim_analysis(entry_id)
+
+    before = time.time()
+    assert outbox.analysis_failed(entry_id, "timeout") is False
+    assert state_of(outbox, entry_id) == DETECTED
+    next_attempt_at = outbox._conn.execute(
+        "SELECT next_attempt_at FROM outbox WHERE id = ?", (entry_id,)
+    ).fetchone()[0]
+    assert next_attempt_at >= before + 10
+    # 退避期间不会被领取
+    assert outbox.claim_analysis() is None
+
+    outbox.claim_analysis(entry_id)
+    assert outbox.analysis_failed(entry_id, "timeout") is True
+
+
+def test_mark_analyzed_records_time(outbox):
+    entry_id = outbox.enqueue("feed", NEWS, ["wx"])
+    outbox.claim_analysis(entry_id)
+    outbox.mark_analyzed(entry_id, "analysis")
+
+    state, analysis, analyzed_at = outbox._conn.execute(
+        "SELECT state, analysis, analyzed_at FROM outbox WHERE id = ?", (entry_id,)
+    ).fetchone()
+    assert (state, analysis) == (ANALYZED, "analysis")
+    assert analyzed_at is not None
+
+
+def test_claim_deliveries_is_exclusive(outbox, tmp_path):
+    entry_id = analyzed_entry(outbox, ["wx", "spug"])
+    other = Outbox(str(tmp_path / "outbox.db"))
+
+    claimed = outbox.claim_deliveries()
+    assert sorted(channel for _, channel in claimed) == ["spug", "wx"]
+    assert all(entry["id"] == entry_id for entry, _ in claimed)
+    assert other.claim_deliveries() == []
+    other.close()
+
+
+def test_delivery_failed_retries_then_fails_entry(outbox):
+    entry_id = analyzed_entry(outbox, ["wx", "spug"])
+    outbox.claim_deliveries()
+    outbox.mark_delivered(entry_id, "spug")
+
+    assert outbox.delivery_failed(entry_id, "wx", "errcode 45009") is False
+    state, attempts, _ = delivery_of(outbox, entry_id, "wx")
+    assert (state, attempts) == (PENDING, 1)
+    assert state_of(outbox, entry_id) == ANALYZED
+
+    assert outbox.delivery_failed(entry_id, "wx", "errcode 45009") is True
+    assert delivery_of(outbox, entry_id, "wx")[0] == FAILED
+    assert delivery_of(outbox, entry_id, "spug")[0] == DELIVERED
+    assert state_of(outbox, entry_id) == FAILED
+
+
+def test_all_channels_delivered_finishes_entry(outbox):
+    entry_id = analyzed_entry(outbox, ["wx", "spug"])
+    outbox.mark_delivered(entry_id, "wx")
+    assert state_of(outbox, entry_id) == ANALYZED
+    outbox.mark_delivered(entry_id, "spug")
+    assert state_of(outbox, entry_id) == DELIVERED
+    assert outbox.counts() == {DELIVERED: 1}
+
+
+def test_purge_removes_only_old_finished_entries(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), max_attempts=1, retention=3600)
+    delivered = analyzed_entry(outbox, ["wx"])
+    outbox.mark_delivered(delivered, "wx")
+    failed = analyzed_entry(outbox, ["wx"])
+    outbox.delivery_failed(failed, "wx", "error")
+    pending = analyzed_entry(outbox, ["wx"])
+
+    assert outbox.purge() == 0
+    assert outbox.purge(now=time.time() + 3601) == 2
+    assert outbox.counts() == {ANALYZED: 1}
+    remaining = outbox._conn.execute("SELECT DISTINCT outbox_id FROM outbox_delivery").fetchall()
+    assert remaining == [(pending,)]
+    outbox.close()
+
+
+def test_purge_disabled_without_retention(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), retention=0)
+    entry_id = analyzed_entry(outbox, ["wx"])
+    outbox.mark_delivered(entry_id, "wx")
+    assert outbox.purge(now=time.time() + 10 ** 9) == 0
+    outbox.close()
+
+
+def test_worker_analyzes_and_delivers(outbox):
+    entry_id = outbox.enqueue("feed", NEWS, ["wx", "spug"])
+
+    def analyze(entry):
+        outbox.mark_analyzed(entry["id"], "analysis")
+
+    def deliver(entry, channels):
+        return {channel: None if channel == "wx" else "failed" for channel in channels}
+
+    worker = DeliveryWorker(outbox, analyze, deliver)
+    assert worker.run_once() == 3
+    assert delivery_of(outbox, entry_id, "wx")[0] == DELIVERED
+    assert delivery_of(outbox, entry_id, "spug")[:2] == (PENDING, 1)
+
+
+def test_worker_does_not_retry_unconfirmed_delivery(outbox):
+    entry_id = analyzed_entry(outbox, ["wx", "spug"])
+
+    def deliver(entry, channels):
+        return {"wx": None, "spug": Unconfirmed("读取超时，可能已送达")} if len(channels) == 2 else {}
+
+    worker = DeliveryWorker(outbox, analyze=None, deliver=deliver)
+    assert worker.run_once() == 2
+    assert delivery_of(outbox, entry_id, "spug")[:2] == (UNCONFIRMED, 1)
+    assert state_of(outbox, entry_id) == FAILED
+    assert outbox.claim_deliveries() == []
+    assert outbox.next_due() is None
+
+
+def test_worker_skips_when_not_leader(outbox):
+    outbox.enqueue("feed", NEWS, ["wx"])
+    worker = DeliveryWorker(outbox, analyze=None, deliver=None, should_run=lambda: False)
+    assert worker.run_once() == 0
+    assert outbox.counts() == {DETECTED: 1}
+
+
+def test_worker_logs_with_detection_cycle_id(outbox):
+    entry_id = outbox.enqueue("feed", NEWS, ["wx"], cycle_id="abc123")
+    seen = []
+
+    def analyze(entry):
+        seen.append(("analyze", current_cycle_id()))
+        outbox.mark_analyzed(entry["id"], "analysis")
+
+    def deliver(entry, channels):
+        seen.append(("deliver", current_cycle_id()))
+        return {channel: None for channel in channels}
+
+    DeliveryWorker(outbox, analyze, deliver).run_once()
+    assert seen == [("analyze", "abc123"), ("deliver", "abc123")]
+    assert delivery_of(outbox, entry_id, "wx")[0] == DELIVERED
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from MsgPush.payload import TRIMMED_MARK, split_by_lines, split_message, trim_html
+
+
+def byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def test_split_by_lines_packs_whole_lines():
+    content = "第一行\n第二行\n第三行\n"
+    parts = split_by_lines(content, byte_len("第一行\n第二行\n"))
+    assert parts == ["第一行\n第二行", "第三行"]
+
+
+def test_split_by_lines_drops_empty_parts():
+    assert [byte_len(part) for part in split_by_lines("a" * 2048 + "\n", 2048)] == [2048]
+    assert split_by_lines("x\n\n\n", 2) == ["x"]
+    assert split_by_lines("a\n \n", 2) == ["a"]
+
+
+def test_split_by_lines_cuts_oversized_line():
+    parts = split_by_lines("head\n" + "x" * 10 + "\ntail", 4)
+    assert parts == ["head", "xxxx", "xxxx", "xx", "tail"]
+    assert all(byte_len(part) <= 4 for part in parts)
+
+
+def test_split_by_lines_keeps_multibyte_characters():
+    content = "更新" * 5
+    parts = split_by_lines(content, 7)
+    assert "".join(parts) == content
+    assert all(byte_len(part) <= 7 for part in parts)
+    assert parts[0] == "更新"
+
+
+def test_split_message_only_splits_oversized_content():
+    form_data = {"msgtype": "markdown", "markdown": {"content": "短消息"}, "agentid": 1}
+    assert split_message(form_data) == [form_data]
+
+    form_data = {"msgtype": "text", "text": {"content": ("行" * 600 + "\n") * 2}, "agentid": 1}
+    messages = split_message(form_data)
+    assert len(messages) == 2
+    assert all(message["agentid"] == 1 and message["text"]["content"] for message in messages)
+
+
+def test_trim_html_returns_short_content_unchanged():
+    assert trim_html("<p>更新</p>", 100) == "<p>更新</p>"
+
+
+def test_trim_html_does_not_cut_tags_entities_or_characters():
+    mark = "…"
+    assert trim_html("<p>abc</p><strong>x</strong>", 13, mark) == "<p>abc</p>" + mark
+    assert trim_html("<p>a&amp;b</p>", 10, mark) == "<p>a" + mark
+    trimmed = trim_html("中文内容" * 10, 20)
+    assert trimmed.endswith(TRIMMED_MARK)
+    assert byte_len(trimmed) <= 20 + byte_len(TRIMMED_MARK)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import main
+from Analysis.retrieval import NewsIndex
+from Monitor.news_store import SqliteNewsStore
+
+
+def make_news(i: int) -> dict:
+    return {
+        "title": f"CS2 更新 {i}",
+        "link": f"https://example.com/{i}",
+        "pubDate": "Fri, 28 Feb 2025 00:38:11 +0000",
+        "description": "<p>调整了 AK-47 的后坐力</p>",
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteNewsStore(str(tmp_path / "news.db"))
+    yield store
+    store.close()
+
+
+def test_add_skips_indexed_news_before_tokenizing(tmp_path, monkeypatch):
+    index = NewsIndex(str(tmp_path / "index.db"))
+    assert index.add([make_news(1), make_news(2)]) == 2
+
+    calls = []
+    monkeypatch.setattr("Analysis.retrieval.tokenize", lambda text: calls.append(text) or [])
+    assert index.add([make_news(1), make_news(2)]) == 0
+    assert calls == []
+    assert index.count() == 2
+    index.close()
+
+
+def test_items_since_follows_store_position(store):
+    assert store.position() == 0
+    store.add("feed", [make_news(1), make_news(2)])
+    position = store.position()
+    store.add("feed", [make_news(3)])
+    assert [news["link"] for news in store.items_since(0)] == [make_news(i)["link"] for i in (1, 2, 3)]
+    assert [news["link"] for news in store.items_since(position)] == [make_news(3)["link"]]
+
+
+def test_startup_backfill_only_reads_new_rows(store, tmp_path):
+    history_config = {"index_path": str(tmp_path / "index.db")}
+    # 同一链接保存在两个订阅源下，索引条数与存储条数不再相等
+    store.add("feed", [make_news(1), make_news(2)])
+    store.add("other", [make_news(1)])
+    main.create_news_index(history_config, store).close()
+
+    read = []
+    items_since = store.items_since
+    store.items_since = lambda position: read.append(position) or items_since(position)
+    index = main.create_news_index(history_config, store)
+    assert read == []
+    index.close()
+
+    store.add("feed", [make_news(3)])
+    index = main.create_news_index(history_config, store)
+    assert len(read) == 1
+    assert index.count() == 3
+    index.close()